@@ -9,8 +9,9 @@ import multidb
 import amo
 from amo.utils import chunked
 import cronjobs
+from versions.models import Version
 
-from .models import Addon
+from .models import Addon, AppSupport, all_files_in
 
 log = commonware.log.getLogger('z.cron')
 task_log = commonware.log.getLogger('z.task')
@@ -19,25 +20,62 @@ task_log = commonware.log.getLogger('z.task')
 #TODO(davedash): This will not be needed as a cron task after remora.
 @cronjobs.register
 def update_addons_current_version():
-    """Update the current_version field of the addons."""
-    d = Addon.objects.valid().exclude(type=amo.ADDON_PERSONA).values_list('id')
+    """
+    Update the current_version field of the addons.
+
+    The current versions of all the add-ons are worked out with one grouped
+    query per status group, like Addon.get_current_version, taking the
+    highest version id as the newest.  Only the rows that changed are
+    written and invalidated.
+    """
+    addons = Addon.objects.valid().exclude(type=amo.ADDON_PERSONA)
+    current = dict(addons.values_list('id', '_current_version'))
+
+    others = [s for s in amo.VALID_STATUSES
+              if s not in (amo.STATUS_PUBLIC, amo.STATUS_LISTED)]
+    public = all_files_in(
+        Version.objects.filter(addon__status=amo.STATUS_PUBLIC),
+        [amo.STATUS_PUBLIC])
+    listed = Version.objects.filter(addon__status=amo.STATUS_LISTED)
+    other = all_files_in(Version.objects.filter(addon__status__in=others),
+                         amo.VALID_STATUSES)
+
+    # Each add-on is in exactly one status group.  Clear Version's default
+    # ordering so it doesn't end up in the GROUP BY.
+    newest = {}
+    for q in (public, listed, other):
+        newest.update(q.order_by().values('addon')
+                      .annotate(newest=Max('id'))
+                      .values_list('addon', 'newest'))
 
-    with establish_connection() as conn:
-        for chunk in chunked(d, 1000):
-            _update_addons_current_version.apply_async(args=[chunk],
-                                                       connection=conn)
+    changes = {}
+    for addon, version in current.items():
+        next = newest.get(addon)
+        if next != version:
+            changes[addon] = next
+
+    log.info('Updating current_version for %s add-ons.' % len(changes))
+    _change_current_version(changes)
 
 
-@task(rate_limit='2/m')
-def _update_addons_current_version(data, **kw):
-    task_log.debug("[%s@%s] Updating addons current_versions." %
-                   (len(data), _update_addons_current_version.rate_limit))
-    for pk in data:
-        try:
-            addon = Addon.objects.get(pk=pk[0])
-            addon.update_current_version()
-        except Addon.DoesNotExist:
-            task_log.debug("Missing addon: %d" % pk)
+def _change_current_version(changes):
+    cursor = connection.cursor()
+    for chunk in chunked(changes.items(), 1000):
+        cases, params = [], []
+        for addon, version in chunk:
+            cases.append('WHEN %s THEN %s')
+            params.extend([addon, version])
+        ids = [addon for addon, _ in chunk]
+        cursor.execute("""UPDATE addons SET current_version = CASE id %s END
+                          WHERE id IN (%s)""" %
+                       (' '.join(cases), ','.join(['%s'] * len(ids))),
+                       params + ids)
+    transaction.commit_unless_managed()
+
+    # All our updates were sql, so invalidate manually.
+    for chunk in chunked(changes.keys(), 1000):
+        Addon.objects.invalidate(
+            *Addon.objects.no_cache().no_transforms().filter(id__in=chunk))
 
 
 @cronjobs.register
@@ -157,14 +195,15 @@ def addon_last_updated():
 
 @cronjobs.register
 def update_addon_appsupport():
-    # Find all the add-ons that need their app support details updated.
-    no_versions = (Q(status=amo.STATUS_LISTED) |
-                   Q(type__in=[amo.ADDON_PERSONA, amo.ADDON_SEARCH]))
+    """
+    Rebuild AppSupport for add-ons updated since their rows were written.
+
+    Saves keep the table up to date; this catches anything changed behind
+    the ORM's back.
+    """
     newish = (Q(last_updated__gte=F('appsupport__created')) |
               Q(appsupport__created__isnull=True))
-    ids = (Addon.objects.valid().exclude(no_versions).distinct()
-           .filter(newish, versions__apps__isnull=False,
-                   versions__files__status__in=amo.VALID_STATUSES)
+    ids = (Addon.objects.valid().filter(newish).distinct()
            .values_list('id', flat=True))
 
     with establish_connection() as conn:
@@ -173,25 +212,10 @@ def update_addon_appsupport():
 
 
 @task(rate_limit='20/m')
-@transaction.commit_manually
 def _update_appsupport(ids, **kw):
     task_log.debug('Updating appsupport for %r' % ids)
-    delete = 'DELETE FROM appsupport WHERE addon_id IN (%s)'
-    insert = """INSERT INTO appsupport (addon_id, app_id, created, modified)
-                VALUES %s"""
-
-    addons = Addon.objects.no_cache().no_transforms().filter(id__in=ids)
-    apps = [(addon.id, app.id) for addon in addons
-            for app in addon.compatible_apps]
-    s = ','.join('(%s, %s, NOW(), NOW())' % x for x in apps)
-
-    if not apps:
-        return
-
-    cursor = connection.cursor()
-    cursor.execute(delete % ','.join(map(str, ids)))
-    cursor.execute(insert % s)
-    transaction.commit()
+    AppSupport.refresh(ids)
 
     # All our updates were sql, so invalidate manually.
-    Addon.objects.invalidate(*addons)
+    Addon.objects.invalidate(
+        *Addon.objects.no_cache().no_transforms().filter(id__in=ids))
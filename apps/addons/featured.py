@@ -0,0 +1,75 @@
+"""
+A per-process index of the featured add-ons.
+
+Install buttons and the status flags ask every add-on on a listing whether
+it's featured.  Instead of a query per add-on we load the ids of everything
+currently featured, per (app, locale), and everything category-featured, per
+app, in two queries and keep them for ``settings.FEATURED_INDEX_TIMEOUT``
+seconds.  Saving or deleting a Feature or AddonCategory clears the index in
+the current process; other processes catch up when theirs expires.
+"""
+from datetime import date
+import threading
+import time
+
+from django.conf import settings
+
+import commonware.log
+
+log = commonware.log.getLogger('z.addons')
+
+
+class FeaturedIndex(object):
+
+    def __init__(self):
+        self.features, self.categories = {}, {}
+        self.expires = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        from addons.models import AddonCategory, Feature
+        today = date.today()
+
+        features = {}
+        qs = (Feature.objects.no_cache()
+              .filter(start__lte=today, end__gte=today)
+              .values_list('application', 'locale', 'addon'))
+        for app, locale, addon in qs:
+            key = app, (locale or '').lower()
+            features.setdefault(key, set()).add(addon)
+
+        categories = {}
+        qs = (AddonCategory.objects.no_cache().filter(feature=True)
+              .values_list('category__application', 'addon'))
+        for app, addon in qs:
+            categories.setdefault(app, set()).add(addon)
+
+        log.debug('Loaded %s features and %s category features.' %
+                  (len(features), len(categories)))
+        return features, categories
+
+    def refresh(self):
+        if self.expires > time.time():
+            return
+        with self._lock:
+            if self.expires > time.time():
+                return
+            self.features, self.categories = self.load()
+            self.expires = time.time() + settings.FEATURED_INDEX_TIMEOUT
+
+    def is_featured(self, addon_id, app_id, lang):
+        """Featured for ``app_id`` in all locales or in ``lang``?"""
+        self.refresh()
+        for locale in ('', (lang or '').lower()):
+            if addon_id in self.features.get((app_id, locale), ()):
+                return True
+        return False
+
+    def is_category_featured(self, addon_id, app_id):
+        self.refresh()
+        return addon_id in self.categories.get(app_id, ())
+
+    def clear(self, **kw):
+        self.expires = 0
+
+index = FeaturedIndex()
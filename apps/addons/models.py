@@ -5,8 +5,9 @@ import json
 import time
 
 from django.conf import settings
-from django.db import models
-from django.db.models import Q, Sum
+from django.db import connection, models, transaction
+from django.db.models import Max, Sum
+from django.db.models.signals import pre_save, post_save, post_delete
 
 import caching.base as caching
 
@@ -14,12 +15,28 @@ import amo.models
 from amo.fields import DecimalCharField
 from amo.utils import urlparams, sorted_groupby, JSONEncoder
 from amo.urlresolvers import reverse
+from files.models import File
 from reviews.models import Review
 from stats.models import Contribution as ContributionStats, ShareCountTotal
 from translations.fields import (TranslatedField, PurifiedField,
                                  LinkifiedField, translations_with_fallback)
 from users.models import UserProfile
-from versions.models import Version
+from versions.models import ApplicationsVersions, Version
+
+from . import featured
+
+
+def all_files_in(versions, status):
+    """Filter ``versions`` to the ones where every file is in ``status``."""
+    status_list = ','.join(map(str, status))
+    return versions.filter(files__status__in=status).extra(
+        where=["""
+            NOT EXISTS (
+                SELECT 1 FROM versions as v2
+                INNER JOIN files AS f2 ON (f2.version_id = v2.id)
+                WHERE v2.id = versions.id
+                AND f2.status NOT IN (%s))
+            """ % status_list])
 
 
 class AddonManager(amo.models.ManagerBase):
@@ -57,20 +74,26 @@ class AddonManager(amo.models.ManagerBase):
         """
         Listed add-ons have a version with a file matching ``status`` and are
         not inactive.  Personas and self-hosted add-ons will be returned too.
+
+        This is a single join on AppSupport, which keeps one row per app and
+        file status for each add-on.
         """
         if len(status) == 0:
             status = [amo.STATUS_PUBLIC]
 
-        has_version = Q(versions__apps__application=app.id,
-                        versions__files__status__in=status)
-        is_weird = Q(type=amo.ADDON_PERSONA) | Q(status=amo.STATUS_LISTED)
-        return self.filter(has_version | is_weird,
-                           inactive=False, status__in=status).distinct()
+        qs = self.filter(appsupport__app=app.id,
+                         appsupport__status__in=status,
+                         inactive=False, status__in=status)
+        # An add-on can only match more than one row if we asked for more
+        # than one status.
+        return qs.distinct() if len(status) > 1 else qs
 
 
 class Addon(amo.models.ModelBase):
     STATUS_CHOICES = amo.STATUS_CHOICES.items()
     CONTRIB_CHOICES = sorted(amo.CONTRIB_CHOICES.items())
+    # The translated fields listing pages draw; the others are deferred.
+    LISTING_TRANSLATIONS = ('name', 'summary', 'description')
 
     guid = models.CharField(max_length=255, unique=True, null=True)
     name = TranslatedField()
@@ -212,16 +235,7 @@ class Addon(amo.models.ModelBase):
             else:
                 status = amo.VALID_STATUSES
 
-            status_list = ','.join(map(str, status))
-            return self.versions.filter(
-                files__status__in=status).extra(
-                where=["""
-                    NOT EXISTS (
-                        SELECT 1 FROM versions as v2
-                        INNER JOIN files AS f2 ON (f2.version_id = v2.id)
-                        WHERE v2.id = versions.id
-                        AND f2.status NOT IN (%s))
-                    """ % status_list])[0]
+            return all_files_in(self.versions.all(), status)[0]
 
         except (IndexError, Version.DoesNotExist):
             return None
@@ -240,16 +254,68 @@ class Addon(amo.models.ModelBase):
 
     @property
     def current_version(self):
-        "Returns the current_version field or updates it if needed."
+        """
+        Returns the current_version field, or works it out if that's not
+        set.  Reads don't save it; update_addons_current_version does.
+        """
 
         if self.type_id == amo.ADDON_PERSONA:
             return
 
         if not self._current_version:
-            self.update_current_version()
+            if not hasattr(self, '_computed_current_version'):
+                self._computed_current_version = self.get_current_version()
+            return self._computed_current_version
 
         return self._current_version
 
+    @staticmethod
+    def attach_current_versions(addons):
+        """
+        Attach the current version of each of ``addons`` in a few queries:
+        one for the add-ons with current_version set, one grouped query per
+        status group (like get_current_version) for the rest, taking the
+        highest version id as the newest like update_addons_current_version,
+        and one to fetch those versions.  Nothing is saved.
+        """
+        by_version = dict((a._current_version_id, a) for a in addons
+                          if a._current_version_id)
+        if by_version:
+            qs = Version.objects.no_cache().filter(id__in=by_version.keys())
+            for version in qs:
+                by_version[version.id]._current_version = version
+
+        groups = {}
+        for addon in addons:
+            if addon._current_version_id:
+                continue
+            if addon.status == amo.STATUS_PUBLIC:
+                status = (amo.STATUS_PUBLIC,)
+            elif addon.status == amo.STATUS_LISTED:
+                status = None
+            else:
+                status = tuple(amo.VALID_STATUSES)
+            groups.setdefault(status, []).append(addon)
+
+        # addon id => newest version id.  Clear Version's default ordering so
+        # it doesn't end up in the GROUP BY.
+        newest = {}
+        for status, group in groups.items():
+            qs = Version.objects.no_cache().filter(addon__in=group)
+            if status is not None:
+                qs = all_files_in(qs, status)
+            newest.update(qs.order_by().values('addon')
+                          .annotate(newest=Max('id'))
+                          .values_list('addon', 'newest'))
+
+        versions = {}
+        if newest:
+            qs = Version.objects.no_cache().filter(id__in=newest.values())
+            versions = dict((v.id, v) for v in qs)
+        for group in groups.values():
+            for addon in group:
+                addon._computed_current_version = versions.get(
+                    newest.get(addon.id))
 
     @staticmethod
     def transformer(addons):
@@ -260,9 +326,7 @@ class Addon(amo.models.ModelBase):
         personas = [a for a in addons if a.type_id == amo.ADDON_PERSONA]
         addons = [a for a in addons if a.type_id != amo.ADDON_PERSONA]
 
-        # TODO(jbalogh): It would be awesome to get the versions in one
-        # (or a few) queries, but we'll accept the overhead here to roll up
-        # some version queries.
+        Addon.attach_current_versions(addons)
         versions = filter(None, (a.current_version for a in addons))
         Version.transformer(versions)
 
@@ -316,39 +380,40 @@ class Addon(amo.models.ModelBase):
         Returns the addon's thumbnail url or a default.
         """
         try:
-            preview = self.previews.all()[0]
+            preview = self.all_previews[0]
             return preview.thumbnail_url
 
         except IndexError:
             return settings.MEDIA_URL + '/img/amo2009/icons/no-preview.png'
 
+    @amo.cached_property(writable=True)
+    def all_previews(self):
+        """The previews as a list; attach_previews fills it for a batch."""
+        return list(self.previews.all())
+
     def is_selfhosted(self):
         return self.status == amo.STATUS_LISTED
 
     def is_unreviewed(self):
         return self.status in amo.UNREVIEWED_STATUSES
 
-    @caching.cached_method
     def is_featured(self, app, lang):
         """is add-on globally featured for this app and language?"""
-        locale_filter = (Q(feature__locale=lang) |
-                         Q(feature__locale__isnull=True) |
-                         Q(feature__locale=''))
-        return Addon.objects.featured(app).filter(
-            locale_filter, pk=self.pk).exists()
+        return featured.index.is_featured(self.id, app.id, lang)
 
-    @caching.cached_method
     def is_category_featured(self, app, lang):
         """is add-on featured in any category for this app?"""
         # XXX should probably take feature_locales under consideration, even
         # though remora didn't do that
-        return AddonCategory.objects.filter(
-            addon=self, feature=True,
-            category__application__id=app.id).exists()
+        return featured.index.is_category_featured(self.id, app.id)
 
-    @amo.cached_property
+    @amo.cached_property(writable=True)
     def tags_partitioned_by_developer(self):
-        "Returns a tuple of developer tags and user tags for this addon."
+        """
+        Returns a tuple of developer tags and user tags for this addon.
+
+        attach_tags fills it with lists for a batch of add-ons.
+        """
 
         # TODO(davedash): We can't cache these tags until /tags/ are moved
         # into Zamboni.
@@ -390,13 +455,73 @@ class Addon(amo.models.ModelBase):
     def has_eula(self):
         return self.eula and self.eula.localized_string
 
-    @caching.cached_method
     def share_counts(self):
+        if hasattr(self, '_share_counts'):
+            return self._share_counts
+        return self._get_share_counts()
+
+    @caching.cached_method
+    def _get_share_counts(self):
         rv = collections.defaultdict(int)
         rv.update(ShareCountTotal.objects.filter(addon=self)
                   .values_list('service', 'count'))
         return rv
 
+    # Opt-in transformers for listings: .transform(Addon.attach_previews)
+    # fetches the previews of every add-on in the queryset with one query
+    # instead of one per add-on.
+
+    @staticmethod
+    def attach_previews(addons):
+        """Attach ``all_previews`` to ``addons`` in one query."""
+        previews = collections.defaultdict(list)
+        for preview in Preview.objects.no_cache().filter(addon__in=addons):
+            previews[preview.addon_id].append(preview)
+        for addon in addons:
+            addon.all_previews = previews[addon.id]
+
+    @staticmethod
+    def attach_tags(addons):
+        """
+        Attach ``tags_partitioned_by_developer`` to ``addons`` in one query.
+        A tag is a developer tag if one of the add-on's authors added it.
+        """
+        from tags.models import AddonTag
+        by_author = """EXISTS (
+            SELECT 1 FROM addons_users
+            WHERE addons_users.addon_id = users_tags_addons.addon_id
+            AND addons_users.user_id = users_tags_addons.user_id)"""
+        qs = (AddonTag.objects.no_cache()
+              .filter(addon__in=addons, tag__blacklisted=False)
+              .select_related('tag').order_by('tag__tag_text')
+              .extra(select={'by_author': by_author}))
+
+        tags = collections.defaultdict(list)
+        dev = collections.defaultdict(set)
+        for addon_tag in qs:
+            addon_id, tag = addon_tag.addon_id, addon_tag.tag
+            if tag not in tags[addon_id]:
+                tags[addon_id].append(tag)
+            if addon_tag.by_author:
+                dev[addon_id].add(tag.id)
+
+        for addon in addons:
+            ts, ids = tags[addon.id], dev[addon.id]
+            addon.tags_partitioned_by_developer = (
+                [t for t in ts if t.id in ids],
+                [t for t in ts if t.id not in ids])
+
+    @staticmethod
+    def attach_share_counts(addons):
+        """Attach the totals ``share_counts()`` returns in one query."""
+        counts = dict((a.id, collections.defaultdict(int)) for a in addons)
+        qs = (ShareCountTotal.objects.filter(addon__in=addons)
+              .values_list('addon', 'service', 'count'))
+        for addon_id, service, count in qs:
+            counts[addon_id][service] = count
+        for addon in addons:
+            addon._share_counts = counts[addon.id]
+
 
 class Persona(caching.CachingMixin, models.Model):
     """Personas-specific additions to the add-on model."""
@@ -694,9 +819,127 @@ class Preview(amo.models.ModelBase):
 
 
 class AppSupport(amo.models.ModelBase):
-    """Cache to tell us if an add-on's current version supports an app."""
+    """
+    Denormalized listing table behind AddonManager.listed.
+
+    There's a row for each (addon, app, file status) where one of the
+    add-on's versions supports the app and has a file with that status,
+    spanning the lowest ``min`` and highest ``max`` app version_int of those
+    versions.  Personas and self-hosted add-ons have no versions to go by,
+    so they get a row for every app with the add-on's own status.
+
+    The rows for an add-on are rebuilt whenever it, its versions, their
+    apps or their files are deleted, or saved with a change to a field in
+    APPSUPPORT_FIELDS.
+    """
     addon = models.ForeignKey(Addon)
     app = models.ForeignKey('applications.Application')
+    status = models.PositiveIntegerField()
+    type = models.PositiveIntegerField(db_column='addontype_id')
+    min = models.BigIntegerField(null=True)
+    max = models.BigIntegerField(null=True)
 
     class Meta:
         db_table = 'appsupport'
+        unique_together = ('addon', 'app', 'status')
+
+    @classmethod
+    def refresh(cls, ids):
+        """Rebuild the rows for the add-ons in ``ids``."""
+        ids = map(int, ids)
+        if not ids:
+            return
+        in_ids = ','.join(map(str, ids))
+        weird = ('(addons.addontype_id = %s OR addons.status = %s)' %
+                 (amo.ADDON_PERSONA, amo.STATUS_LISTED))
+        cursor = connection.cursor()
+        cursor.execute('DELETE FROM appsupport WHERE addon_id IN (%s)'
+                       % in_ids)
+        cursor.execute("""
+            INSERT IGNORE INTO appsupport (addon_id, app_id, status,
+                                           addontype_id, min, max,
+                                           created, modified)
+            SELECT addons.id, av.application_id, files.status,
+                   addons.addontype_id, MIN(min_av.version_int),
+                   MAX(max_av.version_int), NOW(), NOW()
+            FROM addons
+            INNER JOIN versions ON (versions.addon_id = addons.id)
+            INNER JOIN applications_versions AS av
+                ON (av.version_id = versions.id)
+            INNER JOIN files ON (files.version_id = versions.id)
+            LEFT JOIN appversions AS min_av ON (min_av.id = av.min)
+            LEFT JOIN appversions AS max_av ON (max_av.id = av.max)
+            WHERE addons.id IN (%s) AND NOT %s
+            GROUP BY addons.id, av.application_id, files.status
+            """ % (in_ids, weird))
+        cursor.execute("""
+            INSERT IGNORE INTO appsupport (addon_id, app_id, status,
+                                           addontype_id, created, modified)
+            SELECT addons.id, applications.id, addons.status,
+                   addons.addontype_id, NOW(), NOW()
+            FROM addons, applications
+            WHERE addons.id IN (%s) AND %s
+            """ % (in_ids, weird))
+        transaction.commit_unless_managed()
+
+
+# The fields AppSupport rows are built from.  Saves that don't change any of
+# them leave the rows alone.
+APPSUPPORT_FIELDS = {
+    Addon: ('status', 'type'),
+    Version: ('addon',),
+    File: ('status', 'version'),
+    ApplicationsVersions: ('application', 'version', 'min', 'max'),
+}
+
+
+def appsupport_state(instance):
+    opts = instance._meta
+    return tuple(getattr(instance, opts.get_field(f).attname)
+                 for f in APPSUPPORT_FIELDS[instance.__class__])
+
+
+def remember_appsupport_state(sender, instance, raw=False, **kw):
+    """Read the stored fields so appsupport_saved can tell what changed."""
+    if raw or instance.pk is None:
+        return
+    rows = (sender.objects.no_cache().filter(pk=instance.pk)
+            .values_list(*APPSUPPORT_FIELDS[sender]))
+    instance._appsupport_state = tuple(rows[0]) if rows else None
+
+
+def appsupport_saved(sender, instance, raw=False, created=False, **kw):
+    stored = instance.__dict__.pop('_appsupport_state', None)
+    if raw or created or appsupport_state(instance) != stored:
+        refresh_appsupport(sender, instance)
+
+
+def refresh_appsupport(sender, instance, **kw):
+    """Rebuild the AppSupport rows of the add-on ``instance`` belongs to."""
+    if sender is Addon:
+        AppSupport.refresh([instance.id])
+        # listed() results depend on these rows, so flush the add-on too.
+        Addon.objects.invalidate(instance)
+        return
+    elif sender is Version:
+        ids = [instance.addon_id]
+    else:
+        # Files and ApplicationsVersions hang off a version.
+        ids = (Version.objects.no_cache().filter(id=instance.version_id)
+               .values_list('addon', flat=True))
+    ids = list(ids)
+    AppSupport.refresh(ids)
+    Addon.objects.invalidate(*Addon.objects.no_cache().no_transforms()
+                             .filter(id__in=ids))
+
+for model in APPSUPPORT_FIELDS:
+    uid = 'addons.appsupport.%s' % model.__name__
+    pre_save.connect(remember_appsupport_state, sender=model,
+                     dispatch_uid=uid)
+    post_save.connect(appsupport_saved, sender=model, dispatch_uid=uid)
+    post_delete.connect(refresh_appsupport, sender=model, dispatch_uid=uid)
+
+for model in (Feature, AddonCategory):
+    for signal in (post_save, post_delete):
+        signal.connect(featured.index.clear, sender=model,
+                       dispatch_uid='addons.featured.%s' % model.__name__)
@@ -1,3 +1,4 @@
+import mock
 from nose.tools import eq_
 import test_utils
 
@@ -13,8 +14,24 @@ class CurrentVersionTestCase(test_utils.TestCase):
 
     def test_addons(self):
         eq_(Addon.objects.filter(_current_version=None, pk=3615).count(), 1)
-        cron._update_addons_current_version(((3615,),))
-        eq_(Addon.objects.filter(_current_version=None, pk=3615).count(), 0)
+        cron.update_addons_current_version()
+        eq_(Addon.objects.get(pk=3615)._current_version_id,
+            Addon.objects.get(pk=3615).get_current_version().id)
+
+    def test_only_changes_written(self):
+        cron.update_addons_current_version()
+        with mock.patch('addons.cron._change_current_version') as change:
+            cron.update_addons_current_version()
+            eq_(change.call_args[0][0], {})
+
+    def test_stale_version_replaced(self):
+        cron.update_addons_current_version()
+        addon = Addon.objects.get(pk=3615)
+        old = addon.versions.exclude(id=addon._current_version_id)[0]
+        Addon.objects.filter(pk=3615).update(_current_version=old)
+        cron.update_addons_current_version()
+        eq_(Addon.objects.get(pk=3615)._current_version_id,
+            addon._current_version_id)
 
 
 class TestLastUpdated(test_utils.TestCase):
@@ -51,11 +68,17 @@ class TestLastUpdated(test_utils.TestCase):
             eq_(addon.last_updated, addon.created)
 
     def test_appsupport(self):
+        rows = lambda: sorted(AppSupport.objects
+                              .values_list('addon', 'app', 'status'))
+        # Loading the fixtures filled the table through the signals.
+        expected = rows()
+        assert expected
+
+        AppSupport.objects.all().delete()
         ids = Addon.objects.values_list('id', flat=True)
         cron._update_appsupport(ids)
-
-        eq_(AppSupport.objects.count(), 11)
+        eq_(rows(), expected)
 
         # Run it again to test deletes.
         cron._update_appsupport(ids)
-        eq_(AppSupport.objects.count(), 11)
+        eq_(rows(), expected)
@@ -4,12 +4,13 @@ import itertools
 from django.conf import settings
 from django.core.cache import cache
 
+import mock
 from nose.tools import eq_, assert_not_equal
 import test_utils
 
 import amo
 from addons.models import (Addon, AddonPledge, AddonRecommendation, AddonType,
-                           Category, Persona, Preview)
+                           AppSupport, Category, Feature, Persona, Preview)
 from reviews.models import Review
 from users.models import UserProfile
 from versions.models import Version
@@ -63,6 +64,28 @@ class TestAddonManager(test_utils.TestCase):
         addon.versions.get().files.get().delete()
         eq_(q.count(), 0)
 
+    def test_listed_app_support(self):
+        addon = Addon.objects.get(id=1)
+        av = addon.versions.get().apps.get(application=amo.FIREFOX.id)
+        row = AppSupport.objects.get(addon=addon, app=amo.FIREFOX.id)
+        eq_(row.status, amo.STATUS_PUBLIC)
+        eq_((row.min, row.max), (av.min.version_int, av.max.version_int))
+
+        # Dropping Firefox from the version drops the add-on from listed().
+        av.delete()
+        eq_(Addon.objects.listed(amo.FIREFOX).count(), 0)
+
+    def test_appsupport_skips_unrelated_saves(self):
+        addon = Addon.objects.no_cache().get(id=1)
+        with mock.patch('addons.models.AppSupport.refresh') as refresh:
+            addon.weekly_downloads += 1
+            addon.save()
+            assert not refresh.called
+
+            addon.status = amo.STATUS_UNREVIEWED
+            addon.save()
+            eq_(refresh.call_args[0][0], [addon.id])
+
     def test_public(self):
         public = Addon.objects.public()
         for a in public:
@@ -101,6 +124,27 @@ class TestAddonModels(test_utils.TestCase):
         a = Addon.objects.get(pk=3723)
         eq_(a.current_version, None)
 
+    def test_current_version_not_saved_on_read(self):
+        Addon.objects.filter(pk=3615).update(_current_version=None)
+        a = Addon.objects.no_cache().get(pk=3615)
+        eq_(a.current_version.id, 24007)
+        eq_(Addon.objects.filter(pk=3615, _current_version=None).count(), 1)
+
+    def test_attach_current_versions(self):
+        Addon.objects.update(_current_version=None)
+        addons = list(Addon.objects.no_cache().filter(pk__in=[3615, 3723, 55])
+                      .order_by('id'))
+        eq_([a.current_version.id for a in addons], [55, 24007, 89774])
+
+        # With the column set they come from a single id__in query.
+        for addon in addons:
+            addon.update_current_version()
+        addons = list(Addon.objects.no_cache().filter(pk__in=[3615, 3723, 55])
+                      .order_by('id'))
+        eq_([a._current_version.id for a in addons], [55, 24007, 89774])
+        assert not any(hasattr(a, '_computed_current_version')
+                       for a in addons)
+
     def test_current_beta_version(self):
         a = Addon.objects.get(pk=5299)
         eq_(a.current_beta_version.id, 78841)
@@ -189,6 +233,12 @@ class TestAddonModels(test_utils.TestCase):
         assert a.is_category_featured(amo.FIREFOX, 'en-US'), (
             'category featured add-on not recognized')
 
+    def test_featured_index_follows_changes(self):
+        a = Addon.objects.get(pk=1003)
+        assert a.is_featured(amo.FIREFOX, 'en-US')
+        Feature.objects.filter(addon=a).delete()
+        assert not a.is_featured(amo.FIREFOX, 'en-US')
+
     def test_has_eula(self):
         addon = lambda: Addon.objects.get(pk=3615)
         assert not addon().has_eula
@@ -302,6 +352,33 @@ class TestAddonRecommendations(test_utils.TestCase):
                 eq_(scores[addon][rec.other_addon_id], rec.score)
 
 
+class TestBatchTransformers(test_utils.TestCase):
+    fixtures = ['base/fixtures', 'tags/tags', 'sharing/share_counts']
+
+    def test_attach_previews(self):
+        addons = list(Addon.objects.filter(id__in=[7172, 73])
+                      .transform(Addon.attach_previews))
+        by_id = dict((a.id, a) for a in addons)
+        eq_([p.id for p in by_id[7172].all_previews],
+            [p.id for p in Addon.objects.get(id=7172).previews.all()])
+        eq_(by_id[73].all_previews, [])
+        assert by_id[73].thumbnail_url.endswith('/icons/no-preview.png')
+
+    def test_attach_tags(self):
+        expected = Addon.objects.get(id=3615).tags_partitioned_by_developer
+        addon = Addon.objects.transform(Addon.attach_tags).get(id=3615)
+        ids = lambda tags: sorted(t.id for t in tags)
+        dev, user = addon.tags_partitioned_by_developer
+        eq_(ids(dev), ids(expected[0]))
+        eq_(ids(user), ids(expected[1]))
+
+    def test_attach_share_counts(self):
+        addon = Addon.objects.transform(Addon.attach_share_counts).get(
+            id=7172)
+        eq_(addon.share_counts()['digg'], 29)
+        eq_(addon.share_counts()['no-such-service'], 0)
+
+
 class TestListedAddonTwoVersions(test_utils.TestCase):
     fixtures = ['addons/listed-two-versions']
 
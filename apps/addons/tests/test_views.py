@@ -4,6 +4,7 @@ from django import test
 from django.conf import settings
 from django.core.cache import cache
 
+import mock
 from mock import Mock
 from nose.tools import eq_
 import test_utils
@@ -64,6 +65,15 @@ class TestHomepage(test_utils.TestCase):
         for addon in featured:
             assert addon.is_featured(amo.FIREFOX, settings.LANGUAGE_CODE)
 
+    def test_featured_sampled_once(self):
+        """The featured listing and its tab share one random sample."""
+        with mock.patch('addons.views.random_sample') as sample:
+            sample.return_value = Addon.objects.filter(id=2464)
+            response = self.client.get(self.base_url, follow=True)
+        eq_(sample.call_count, 1)
+        filter = response.context['filter']
+        eq_(filter.all()['featured'], filter.qs)
+
     def _test_invalid_feature(self):
         response = self.client.get(self.base_url + '?browse=xxx')
         self.assertRedirects(response, '/en-US/firefox/', status_code=301)
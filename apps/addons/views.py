@@ -9,6 +9,7 @@ from tower import ugettext_lazy as _lazy
 import amo
 from amo.utils import sorted_groupby
 from amo import urlresolvers
+from amo.models import random_sample
 from amo.urlresolvers import reverse
 from bandwagon.models import Collection, CollectionFeature, CollectionPromo
 from stats.models import GlobalStat
@@ -186,8 +187,8 @@ def persona_detail(request, addon):
     # this persona's categories
     categories = addon.categories.filter(application=request.APP.id)
     if categories:
-        category_personas = Addon.objects.valid().filter(
-            categories=categories[0]).exclude(pk=addon.pk).order_by('?')[:6]
+        qs = Addon.objects.valid().filter(categories=categories[0])
+        category_personas = random_sample(qs, 6, exclude=[addon.pk])
     else:
         category_personas = None
 
@@ -229,12 +230,19 @@ class HomepageFilter(object):
             ('new', _lazy('Recently Added')),
             ('updated', _lazy('Recently Updated')))
 
+    # Options shown as a random sample of sample_size add-ons.
+    shuffled = ('featured',)
+    sample_size = 10
+    # The column each option sorts on, for paginate(seek=...).
+    seek_fields = {}
+
     def __init__(self, request, base, key, default):
         self.opts_dict = dict(self.opts)
         self.request = request
         self.base_queryset = base
         self.field, self.title = self.options(self.request, key, default)
         self.qs = self.filter(self.field)
+        self.seek = self.seek_fields.get(self.field)
 
     def options(self, request, key, default):
         """Get the (option, title) pair we should according to the request."""
@@ -246,11 +254,16 @@ class HomepageFilter(object):
 
     def all(self):
         """Get a full mapping of {option: queryset}."""
-        return dict((field, self.filter(field)) for field in dict(self.opts))
+        # Reuse self.qs so a shuffled option is only sampled once.
+        return dict((field, self.qs if field == self.field
+                     else self.filter(field)) for field in dict(self.opts))
 
     def filter(self, field):
         """Get the queryset for the given field."""
-        return self.base_queryset.distinct() & self._filter(field).distinct()
+        qs = self.base_queryset.distinct() & self._filter(field).distinct()
+        if field in self.shuffled:
+            return random_sample(qs, self.sample_size)
+        return qs
 
     def _filter(self, field):
         qs = Addon.objects
@@ -261,8 +274,7 @@ class HomepageFilter(object):
         elif field == 'updated':
             return qs.order_by('-last_updated')
         else:
-            # It's ok to cache this for a while...it'll expire eventually.
-            return qs.featured(self.request.APP).order_by('?')
+            return qs.featured(self.request.APP)
 
 
 def home(request):
@@ -98,14 +98,20 @@ class Paginator(object):
         self.page = pager.number
         self.num_pages = pager.paginator.num_pages
         self.count = pager.paginator.count
+        # Keyset pagers only link the first few pages by number.
+        self.numbered = getattr(pager, 'numbered_pages', None)
 
         pager.page_range = self.range()
-        pager.dotted_upper = self.num_pages not in pager.page_range
+        pager.dotted_upper = (self.num_pages not in pager.page_range
+                              and not self.numbered)
         pager.dotted_lower = 1 not in pager.page_range
 
     def range(self):
         """Return a list of page numbers to show in the paginator."""
         page, total, span = self.page, self.num_pages, self.span
+        if self.numbered:
+            total = min(total, self.numbered)
+            page = min(page, total)
         if total < self.max:
             lower, upper = 0, total
         elif page < span + 1:
@@ -1,9 +1,20 @@
+import hashlib
+import itertools
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 
 import queryset_transform
 
 import caching.base
-from translations import transformer
+from translations import fields, transformer
+
+# Objects built and transformed together by TransformQuerySet when the
+# transforms fetch in bulk.
+TRANSFORM_BATCH_SIZE = 1000
 
 
 class TransformQuerySet(queryset_transform.TransformQuerySet):
@@ -17,6 +28,40 @@ class TransformQuerySet(queryset_transform.TransformQuerySet):
     def no_transforms(self):
         return self.pop_transforms()[1]
 
+    def iterator(self):
+        if any(getattr(fn, 'batching', False) for fn in self._transform_fns):
+            return self._batched_iterator()
+        return super(TransformQuerySet, self).iterator()
+
+    def _batched_iterator(self):
+        """
+        Build and transform the objects ``TRANSFORM_BATCH_SIZE`` at a time.
+        Objects of TranslatedFieldMixin models skip their own translation
+        queries since the transform fetches them for the whole batch.
+        """
+        rows = models.query.QuerySet.iterator(self)
+        while True:
+            with fields.batching(self.model):
+                objs = list(itertools.islice(rows, TRANSFORM_BATCH_SIZE))
+            if not objs:
+                return
+            for fn in self._transform_fns:
+                fn(objs)
+            for obj in objs:
+                yield obj
+
+    def only_translations(self, *names):
+        """
+        Only load the translated fields in ``names`` with the objects.  The
+        others are fetched for the whole batch the first time one is used.
+        """
+        qs = self._clone()
+        qs._transform_fns = [
+            transformer.only(*names)
+            if fn is transformer.get_trans or hasattr(fn, 'only') else fn
+            for fn in qs._transform_fns]
+        return qs
+
 
 class RawQuerySet(models.query.RawQuerySet):
     """A RawQuerySet with __len__."""
@@ -49,13 +94,18 @@ class UncachedManagerBase(models.Manager):
         return self._with_translations(TransformQuerySet(self.model))
 
     def _with_translations(self, qs):
-        if hasattr(self.model._meta, 'translated_fields'):
+        if issubclass(self.model, fields.TranslatedFieldMixin):
+            qs = qs.transform(fields.attach_translations)
+        elif hasattr(self.model._meta, 'translated_fields'):
             qs = qs.transform(transformer.get_trans)
         return qs
 
     def transform(self, fn):
         return self.all().transform(fn)
 
+    def only_translations(self, *names):
+        return self.all().only_translations(*names)
+
     def raw(self, raw_query, params=None, *args, **kwargs):
         return RawQuerySet(raw_query, self.model, params=params,
                            using=self._db, *args, **kwargs)
@@ -117,3 +167,92 @@ def manual_order(qs, pks, pk_name='id'):
             order_by=['_manual'])
 
     return objects
+
+
+def query_key(prefix, qs):
+    """A cache key for ``qs`` made from its SQL."""
+    sql = unicode(qs.query).encode('utf-8')
+    return '%s%s:%s' % (settings.CACHE_PREFIX, prefix,
+                        hashlib.md5(sql).hexdigest())
+
+
+def id_pool(qs):
+    """
+    The primary keys of up to ``settings.RANDOM_POOL_SIZE`` random objects
+    in ``qs``, kept in the cache for ``settings.RANDOM_POOL_TIMEOUT`` seconds
+    under a key made from its SQL.
+
+    Bigger sets are sampled once in SQL when the pool is built, so the
+    cached list stays well under memcached's item size limit.
+    """
+    ids = qs.values_list('id', flat=True)
+    key = query_key('id-pool', ids)
+    pool = cache.get(key)
+    if pool is None:
+        pool = list(ids.order_by('?')[:settings.RANDOM_POOL_SIZE])
+        cache.set(key, pool, settings.RANDOM_POOL_TIMEOUT)
+    return pool
+
+
+def random_sample(qs, count, exclude=()):
+    """
+    Up to ``count`` random objects from ``qs``.
+
+    This replaces ``qs.order_by('?')[:count]``: the sample is drawn in Python
+    from the cached ``id_pool(qs)`` and fetched with one id lookup, so the
+    database only sorts the whole set when the pool is rebuilt.  The lookup
+    goes through ``qs`` again so anything that left it since the pool was
+    cached is dropped.
+    """
+    exclude = set(exclude)
+    pool = [pk for pk in id_pool(qs) if pk not in exclude]
+    if not pool:
+        return qs.none()
+    ids = random.sample(pool, min(count, len(pool)))
+    return manual_order(qs, ids)
+
+
+def cached_count(qs, per_page=20):
+    """
+    ``qs.count()`` for listings, cached for ``settings.CACHE_COUNT_TIMEOUT``
+    seconds.  Pass it to ``paginate(count=...)``.
+
+    The key is the count query's SQL with the ordering dropped, so every
+    sort of a listing shares one count.  Only one request counts at a time.
+    Expired counts are kept for ``settings.CACHE_COUNT_STALE_TIMEOUT``
+    seconds, and the others keep serving the stale number.  On a cold cache
+    they wait up to ``settings.CACHE_COUNT_WAIT`` seconds for the count.
+    After that they settle for enough ``per_page`` pages to fill the
+    numbered page links.
+    """
+    qs = qs.order_by()
+    if hasattr(qs, 'no_cache'):
+        qs = qs.no_cache()
+    key = query_key('count', qs)
+    lock = key + ':lock'
+    cached = cache.get(key)
+    if cached is not None:
+        count, expires = cached
+        if (expires > time.time() or
+            not cache.add(lock, 1, settings.CACHE_COUNT_TIMEOUT)):
+            return count
+    elif not cache.add(lock, 1, settings.CACHE_COUNT_TIMEOUT):
+        return wait_for_count(key, per_page)
+    try:
+        count = qs.count()
+        cache.set(key, (count, time.time() + settings.CACHE_COUNT_TIMEOUT),
+                  settings.CACHE_COUNT_STALE_TIMEOUT)
+    finally:
+        cache.delete(lock)
+    return count
+
+
+def wait_for_count(key, per_page):
+    """Wait for another request to cache the count under ``key``."""
+    deadline = time.time() + settings.CACHE_COUNT_WAIT
+    while time.time() < deadline:
+        time.sleep(.1)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0]
+    return settings.NUMBERED_PAGES * per_page
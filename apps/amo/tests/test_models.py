@@ -1,8 +1,12 @@
-from test_utils import TestCase
+from django.conf import settings
+from django.core.cache import cache
 
+import mock
 from nose.tools import eq_
+from test_utils import TestCase
 
-from amo.models import manual_order
+import amo
+from amo.models import cached_count, id_pool, manual_order, random_sample
 from addons.models import Addon
 
 
@@ -16,3 +20,88 @@ class ManualOrderTest(TestCase):
         semi_arbitrary_order = [40, 5299, 3723, 6113]
         addons = manual_order(Addon.objects.all(), semi_arbitrary_order)
         eq_(semi_arbitrary_order, [addon.id for addon in addons])
+
+
+class RandomSampleTest(TestCase):
+    fixtures = ['base/fixtures']
+
+    def test_sample(self):
+        qs = Addon.objects.all()
+        all_ids = set(qs.values_list('id', flat=True))
+        sample = random_sample(qs, 3, exclude=[3615])
+        ids = [a.id for a in sample]
+        eq_(len(ids), 3)
+        eq_(len(set(ids)), 3)
+        assert set(ids) <= all_ids - set([3615])
+
+    def test_pool_is_cached(self):
+        qs = Addon.objects.filter(id__in=[40, 5299, 3723])
+        eq_(sorted(id_pool(qs)), [40, 3723, 5299])
+        with mock.patch('amo.models.cache') as cache:
+            cache.get.return_value = [40]
+            eq_([a.id for a in random_sample(qs, 5)], [40])
+
+    def test_pool_size(self):
+        cache.clear()
+        qs = Addon.objects.all()
+        size = settings.RANDOM_POOL_SIZE
+        settings.RANDOM_POOL_SIZE = 3
+        try:
+            pool = id_pool(qs)
+        finally:
+            settings.RANDOM_POOL_SIZE = size
+        eq_(len(pool), 3)
+        assert set(pool) <= set(qs.values_list('id', flat=True))
+
+    def test_sample_rechecks_queryset(self):
+        qs = Addon.objects.filter(id__in=[40, 5299])
+        with mock.patch('amo.models.cache') as cache:
+            # 3615 is in the cached pool but isn't in qs any more.
+            cache.get.return_value = [40, 3615]
+            eq_([a.id for a in random_sample(qs, 5)], [40])
+
+    def test_empty_pool(self):
+        sample = random_sample(Addon.objects.filter(id__in=[40]), 5,
+                               exclude=[40])
+        eq_(list(sample), [])
+        # Still a queryset, so callers can keep slicing and filtering it.
+        eq_(list(sample.filter(type=amo.ADDON_EXTENSION)[:4]), [])
+
+
+class CachedCountTest(TestCase):
+    fixtures = ['base/fixtures']
+
+    def test_count(self):
+        qs = Addon.objects.filter(id__in=[40, 5299, 3723])
+        eq_(cached_count(qs), 3)
+        # Orderings share the count.
+        with mock.patch('amo.models.cache') as cache:
+            cache.get.return_value = (3, 0)
+            cached_count(qs.order_by('-created'))
+            cached_count(qs)
+            eq_(cache.get.call_args_list[0], cache.get.call_args_list[1])
+
+    def test_stale_count(self):
+        qs = Addon.objects.filter(id__in=[40, 5299])
+        with mock.patch('amo.models.cache') as cache:
+            cache.get.return_value = (7, 0)  # Long expired.
+            cache.add.return_value = False  # Someone else is recounting.
+            eq_(cached_count(qs), 7)
+            eq_(cache.set.call_count, 0)
+
+            cache.add.return_value = True
+            eq_(cached_count(qs), 2)
+            eq_(cache.set.call_args[0][1][0], 2)
+
+    def test_cold_count_locked(self):
+        qs = Addon.objects.filter(id__in=[40, 5299])
+        wait = settings.CACHE_COUNT_WAIT
+        settings.CACHE_COUNT_WAIT = 0
+        try:
+            with mock.patch('amo.models.cache') as cache:
+                cache.get.return_value = None
+                cache.add.return_value = False  # Someone else is counting.
+                eq_(cached_count(qs, 30), settings.NUMBERED_PAGES * 30)
+                eq_(cache.set.call_count, 0)
+        finally:
+            settings.CACHE_COUNT_WAIT = wait
@@ -1,7 +1,14 @@
+import urlparse
+
+from django.conf import settings
+
 from mock import Mock
 from nose.tools import eq_
+import test_utils
 
+from addons.models import Addon
 from amo.helpers import Paginator
+from amo.utils import paginate
 
 
 def mock_pager(page_number, num_pages, count):
@@ -10,6 +17,7 @@ def mock_pager(page_number, num_pages, count):
     m.number = page_number
     m.paginator.num_pages = num_pages
     m.paginator.count = count
+    m.numbered_pages = None
     return m
 
 
@@ -55,3 +63,54 @@ def test_dots():
     p = Paginator(mock_pager(24, 25, 100))
     assert not p.pager.dotted_upper
     assert p.pager.dotted_lower
+
+
+def test_numbered_pages():
+    pager = mock_pager(30, 75, 1500)
+    pager.numbered_pages = 10
+    p = Paginator(pager)
+    eq_(p.range(), [3, 4, 5, 6, 7, 8, 9, 10])
+    assert not pager.dotted_upper
+
+
+class TestSeekPaginate(test_utils.TestCase):
+    fixtures = ['base/fixtures']
+
+    def setUp(self):
+        self._numbered = settings.NUMBERED_PAGES
+        settings.NUMBERED_PAGES = 1
+        self.qs = Addon.objects.all()
+        self.ids = list(self.qs.order_by('-created', '-id')
+                        .values_list('id', flat=True))
+        assert len(self.ids) > 6
+
+    def tearDown(self):
+        settings.NUMBERED_PAGES = self._numbered
+
+    def page(self, url=''):
+        query = urlparse.urlparse(url).query
+        request = test_utils.RequestFactory().get('/?' + query)
+        return paginate(request, self.qs, per_page=2, seek='-created')
+
+    def test_walk_forward_and_back(self):
+        pager = self.page()
+        eq_([a.id for a in pager.object_list], self.ids[:2])
+        assert 'page=' not in pager.next_url
+
+        # Page 2 is past the numbered pages, so it's found with a token.
+        pager = self.page(pager.next_url)
+        eq_(pager.number, 2)
+        eq_([a.id for a in pager.object_list], self.ids[2:4])
+        pager = self.page(pager.next_url)
+        eq_(pager.number, 3)
+        eq_([a.id for a in pager.object_list], self.ids[4:6])
+
+        pager = self.page(pager.previous_url)
+        eq_(pager.number, 2)
+        eq_([a.id for a in pager.object_list], self.ids[2:4])
+        assert 'page=1' in pager.previous_url
+
+    def test_bad_token(self):
+        pager = self.page('/?after=garbage')
+        eq_(pager.number, 1)
+        eq_([a.id for a in pager.object_list], self.ids[:2])
@@ -1,3 +1,4 @@
+import base64
 import cgi
 import itertools
 import operator
@@ -9,6 +10,8 @@ from django.conf import settings
 from django.core import paginator
 from django.core.serializers import json
 from django.core.mail import send_mail as django_send_mail
+from django.db.models import FloatField, Q
+from django.utils import simplejson
 from django.utils.functional import Promise
 from django.utils.encoding import smart_str
 
@@ -69,37 +72,164 @@ def sorted_groupby(seq, key):
     return itertools.groupby(sorted(seq, key=key), key=key)
 
 
-def paginate(request, queryset, per_page=20, count=None):
+def paginate(request, queryset, per_page=20, count=None, seek=None):
     """
     Get a Paginator, abstracting some common paging actions.
 
     If you pass ``count``, that value will be used instead of calling
     ``.count()`` on the queryset.  This can be good if the queryset would
     produce an expensive count query.
+
+    Pass ``seek``, the column the queryset is sorted on (like
+    ``'-weekly_downloads'``), for keyset pagination.  The queryset gets sorted
+    on that column and then id.  Only the first ``settings.NUMBERED_PAGES``
+    pages are linked by number.  Links to later pages carry an opaque token
+    naming the row to seek from, so the database doesn't have to skip an
+    OFFSET's worth of rows.  The links are in ``pager.next_url`` and
+    ``pager.previous_url``.  An explicit ``page`` in the request wins over a
+    token.
+
+    Float columns are paged with OFFSET: a float doesn't come back out of a
+    token exactly enough to seek on equality.
     """
+    if seek and isinstance(seek_field(queryset.model, seek), FloatField):
+        seek = None
+    if seek:
+        queryset = queryset.order_by(*seek_order(seek))
     p = paginator.Paginator(queryset, per_page)
 
     if count is not None:
         p._count = count
 
-    # Get the page from the request, make sure it's an int.
-    try:
-        page = int(request.GET.get('page', 1))
-    except ValueError:
-        page = 1
+    paginated = seek_page(p, seek, request.GET) if seek else None
 
-    # Get a page of results, or the first page if there's a problem.
-    try:
-        paginated = p.page(page)
-    except (paginator.EmptyPage, paginator.InvalidPage):
-        paginated = p.page(1)
+    if paginated is None:
+        # Get the page from the request, make sure it's an int.
+        try:
+            page = int(request.GET.get('page', 1))
+        except ValueError:
+            page = 1
+
+        # Get a page of results, or the first page if there's a problem.
+        try:
+            paginated = p.page(page)
+        except (paginator.EmptyPage, paginator.InvalidPage):
+            paginated = p.page(1)
 
     base = request.build_absolute_uri(request.path)
 
     paginated.url = u'%s?%s' % (base, request.GET.urlencode())
+    paginated.next_url = paginated.previous_url = None
+    paginated.numbered_pages = None
+    if seek:
+        paginated.numbered_pages = settings.NUMBERED_PAGES
+        link_seek_pages(paginated, seek)
     return paginated
 
 
+def _seek_keys(seek):
+    """The columns a ``seek`` sort pages on and whether it's descending."""
+    field = seek.lstrip('-')
+    keys = [field] if field in ('id', 'pk') else [field, 'id']
+    return keys, seek.startswith('-')
+
+
+def seek_field(model, seek):
+    """The model field a ``seek`` like ``'-persona__movers'`` names."""
+    field = None
+    for name in seek.lstrip('-').split('__'):
+        field, _, direct, _ = model._meta.get_field_by_name(name)
+        if not direct:
+            # A reverse relation; follow it to the model it comes from.
+            model = field.model
+        elif field.rel:
+            model = field.rel.to
+    return field
+
+
+def seek_order(seek, reverse=False):
+    """The order_by arguments for paging on ``seek``."""
+    keys, desc = _seek_keys(seek)
+    return [('-' + k if desc != reverse else k) for k in keys]
+
+
+def seek_token(number, values):
+    """An opaque token for page ``number``, which starts after ``values``."""
+    data = simplejson.dumps([number] + list(values), cls=JSONEncoder)
+    return base64.urlsafe_b64encode(data)
+
+
+def read_seek_token(token):
+    """The (page number, values) in a token, or None if it's no good."""
+    try:
+        data = simplejson.loads(base64.urlsafe_b64decode(str(token)))
+        return int(data[0]), data[1:]
+    except (TypeError, ValueError, IndexError, KeyError, UnicodeError):
+        return None
+
+
+def seek_page(p, seek, query):
+    """
+    The page an ``after`` or ``before`` token in ``query`` points at, or
+    None if there isn't a usable token or ``query`` asks for a page number.
+    """
+    from amo.models import manual_order
+
+    if 'page' in query:
+        return None
+    for direction in ('after', 'before'):
+        if direction in query:
+            break
+    else:
+        return None
+    token = read_seek_token(query[direction])
+    keys, desc = _seek_keys(seek)
+    if (not token or token[0] < 1 or len(token[1]) != len(keys)
+        or None in token[1]):
+        return None
+    number, values = token
+
+    # Going forward on a descending sort looks for smaller values.
+    forward = direction == 'after'
+    op = 'lt' if desc == forward else 'gt'
+    q = Q(**{'%s__%s' % (keys[-1], op): values[-1]})
+    if len(keys) == 2:
+        q = (Q(**{'%s__%s' % (keys[0], op): values[0]}) |
+             (Q(**{keys[0]: values[0]}) & q))
+    qs = p.object_list.filter(q)
+
+    if forward:
+        object_list = qs[:p.per_page]
+    else:
+        # Walk backwards from the token, then put the page the right way up.
+        ids = list(qs.order_by(*seek_order(seek, reverse=True))
+                   .values_list('id', flat=True)[:p.per_page])
+        object_list = manual_order(p.object_list, ids[::-1])
+    return paginator.Page(object_list, number, p)
+
+
+def link_seek_pages(pager, seek):
+    """Fill in ``next_url`` and ``previous_url`` for a keyset pager."""
+    def link(number, edge, direction):
+        numbered = urlparams(pager.url, page=number, after=None, before=None)
+        objects = list(pager.object_list)
+        if number <= settings.NUMBERED_PAGES or not objects:
+            return numbered
+        values = [reduce(getattr, k.split('__'), objects[edge])
+                  for k in _seek_keys(seek)[0]]
+        if None in values:
+            # Can't seek from a NULL, so fall back to the page number.
+            return numbered
+        token = seek_token(number, values)
+        return urlparams(pager.url, page=None, after=None, before=None,
+                         **{direction: token})
+
+    if pager.has_next():
+        pager.next_url = link(pager.number + 1, -1, 'after')
+    if pager.has_previous():
+        pager.previous_url = link(pager.number - 1, 0, 'before')
+
+
 def send_mail(subject, message, from_email=None, recipient_list=None,
               fail_silently=False):
     """
@@ -7,7 +7,7 @@ def addon_to_dict(addon):
     Renders an addon in JSON for the API.
     """
     v = addon.current_version
-    previews = addon.previews.all()
+    previews = addon.all_previews
     url = lambda u, **kwargs: settings.SITE_URL + urlparams(u, **kwargs)
     src = 'api'
 
@@ -270,6 +270,7 @@ class ListView(APIView):
             shuffle = False  # By_adu is an ordered list.
         else:
             addons = Addon.objects.featured(APP).distinct() & qs
+        addons = addons.transform(Addon.attach_previews)
 
         args = (addon_type, limit, APP, platform, version, shuffle)
         f = lambda: self._process(addons, *args)
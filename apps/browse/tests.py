@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from django import http
+from django.conf import settings
 from django.core.cache import cache
 
 from mock import patch
@@ -9,6 +10,7 @@ from pyquery import PyQuery as pq
 import test_utils
 
 import amo
+import amo.utils
 from amo.urlresolvers import reverse
 from amo.helpers import urlparams
 from addons.models import Addon, Category
@@ -134,6 +136,39 @@ class TestThemes(test_utils.TestCase):
         ids = self._get_sort('rating')
         eq_(ids, [6113, 7172, 1843, 6704, 10869, 40, 5369, 3615, 55, 73])
 
+    def test_keyset_pages(self):
+        created = [10869, 7172, 6704, 6113, 5369, 3615, 55, 73, 1843, 40]
+        paginate = amo.utils.paginate
+
+        def get(url):
+            response = self.client.get(url)
+            page = response.context['themes']
+            return page, [a.id for a in page.object_list], pq(response.content)
+
+        numbered = settings.NUMBERED_PAGES
+        settings.NUMBERED_PAGES = 1
+        try:
+            with patch('amo.utils.paginate',
+                       lambda request, qs, **kw: paginate(request, qs, 3,
+                                                          **kw)):
+                page, ids, doc = get(urlparams(self.exp_url, sort='created'))
+                eq_(ids, created[:3])
+                assert 'after=' in page.next_url
+
+                # Page 2 comes from a token.
+                page, ids, doc = get(page.next_url)
+                eq_(page.number, 2)
+                eq_(ids, created[3:6])
+
+                # The number links still go where they say.
+                link = [a for a in doc('.pagination a')
+                        if pq(a).text() == '1'][0]
+                page, ids, doc = get(link.get('href'))
+                eq_(page.number, 1)
+                eq_(ids, created[:3])
+        finally:
+            settings.NUMBERED_PAGES = numbered
+
     def test_category_count(self):
         cat = Category.objects.all()[0]
         response = self.client.get(reverse('browse.themes', args=[cat.slug]))
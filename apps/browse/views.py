@@ -10,6 +10,7 @@ import jingo
 import product_details
 
 import amo.utils
+from amo.models import cached_count
 from addons.models import Addon, Category
 from amo.urlresolvers import reverse
 from addons.views import HomepageFilter
@@ -92,6 +93,7 @@ class AddonFilter(object):
     self.sorting: the field we're sorting by
     self.opts: all the sort options
     self.qs: the sorted queryset
+    self.seek: the column to page on with paginate(seek=...), if any
     """
     opts = (('name', _lazy(u'Name')),
             ('updated', _lazy(u'Updated')),
@@ -99,9 +101,16 @@ class AddonFilter(object):
             ('downloads', _lazy(u'Downloads')),
             ('rating', _lazy(u'Rating')))
 
+    # The column behind each sort.  Names are sorted through translations
+    # and ratings are floats, neither of which we can seek on.
+    seek_fields = {'updated': '-last_updated',
+                   'created': '-created',
+                   'downloads': '-weekly_downloads'}
+
     def __init__(self, request, queryset, default):
         self.sorting = self.options(request, default)
         self.qs = self.sort(queryset, self.sorting)
+        self.seek = self.seek_fields.get(self.sorting)
 
     def __iter__(self):
         """Cleverness: this lets you unpack the class like a tuple."""
@@ -134,7 +143,7 @@ def themes(request, category=None):
     categories = order_by_translation(q, 'name')
 
     addons, filter, unreviewed = _listing(request, amo.ADDON_THEME)
-    total_count = addons.count()
+    total_count = cached_count(addons)
 
     if category is None:
         selected = _Category(_('All'), total_count, '')
@@ -142,7 +151,10 @@ def themes(request, category=None):
         selected = dict((c.slug, c) for c in categories)[category]
         addons = addons.filter(categories__slug=category)
 
-    themes = amo.utils.paginate(request, addons)
+    addons = addons.transform(Addon.attach_previews)
+    count = total_count if category is None else cached_count(addons)
+    themes = amo.utils.paginate(request, addons, count=count,
+                                seek=filter.seek)
 
     # Pre-selected category for search form
     search_cat = '%s,0' % amo.ADDON_THEME
@@ -165,7 +177,8 @@ def _listing(request, addon_type, default='downloads'):
         status.append(amo.STATUS_UNREVIEWED)
 
     qs = (Addon.objects.listed(request.APP, *status)
-          .filter(type=addon_type).distinct())
+          .filter(type=addon_type).distinct()
+          .only_translations(*Addon.LISTING_TRANSLATIONS))
     filter = AddonFilter(request, qs, default)
     return filter.qs, filter, unreviewed
 
@@ -185,7 +198,8 @@ def extensions(request, category=None):
     if category:
         addons = addons.filter(categories__id=category.id)
 
-    addons = amo.utils.paginate(request, addons)
+    addons = amo.utils.paginate(request, addons, count=cached_count(addons),
+                                seek=filter.seek)
 
     search_cat = '%s,%s' % (TYPE, category.id if category else 0)
 
@@ -203,6 +217,7 @@ class CategoryLandingFilter(HomepageFilter):
             ('created', _lazy('Recently Added')),
             ('downloads', _lazy('Top Downloads')),
             ('rating', _lazy('Top Rated')))
+    shuffled = ()
 
     def __init__(self, request, base, category, key, default):
         self.category = category
@@ -224,7 +239,9 @@ class CategoryLandingFilter(HomepageFilter):
 
 def category_landing(request, category):
     base = (Addon.objects.listed(request.APP).exclude(type=amo.ADDON_PERSONA)
-            .filter(categories__id=category.id))
+            .filter(categories__id=category.id)
+            .only_translations(*Addon.LISTING_TRANSLATIONS)
+            .transform(Addon.attach_previews))
     filter = CategoryLandingFilter(request, base, category,
                                    key='browse', default='featured')
 
@@ -252,6 +269,10 @@ class PersonasFilter(HomepageFilter):
             ('popular', _lazy('Most Popular')),
             ('rating', _lazy('Top Rated')))
 
+    # Movers and ratings are floats, so those sorts page with OFFSET.
+    seek_fields = {'created': '-created',
+                   'popular': '-persona__popularity'}
+
     def _filter(self, field):
         qs = Addon.objects
         if field == 'created':
@@ -270,7 +291,8 @@ def personas(request, category=None):
                                 type=TYPE)
     categories = order_by_translation(q, 'name')
 
-    base = Addon.objects.valid().filter(type=TYPE)
+    base = (Addon.objects.valid().filter(type=TYPE)
+            .only_translations(*Addon.LISTING_TRANSLATIONS))
     featured = base & Addon.objects.featured(request.APP)
     is_homepage = category is None and 'sort' not in request.GET
 
@@ -287,7 +309,9 @@ def personas(request, category=None):
 
     # Pass the count from base instead of letting it come from
     # filter.qs.count() since that would join against personas.
-    addons = amo.utils.paginate(request, filter.qs, 30, count=base.count())
+    addons = amo.utils.paginate(request, filter.qs, 30,
+                                count=cached_count(base, 30),
+                                seek=filter.seek)
 
     search_cat = '%s,%s' % (TYPE, category.id if category else 0)
 
@@ -10,6 +10,7 @@ from django.views.decorators.csrf import csrf_exempt
 import jingo
 
 import amo.utils
+from amo.models import manual_order
 import api.utils
 import api.views
 from addons.models import Addon
@@ -140,9 +141,9 @@ def _recommendations(request, limit, token, recs):
     """Return a JSON response for the recs view."""
     ids = list(recs.addons.order_by('collectionaddon__ordering')
                .values_list('id', flat=True))[:limit]
+    addons = manual_order(Addon.objects.transform(Addon.attach_previews), ids)
     data = {'token': token, 'recommendations': recs.get_url_path(),
-            'addons': [api.utils.addon_to_dict(Addon.objects.get(pk=pk))
-                       for pk in ids]}
+            'addons': [api.utils.addon_to_dict(a) for a in addons]}
     content = json.dumps(data, cls=amo.utils.JSONEncoder)
     return http.HttpResponse(content, content_type='application/json')
 
@@ -121,12 +121,14 @@ def get_sections():
 
 
 @admin.site.admin_view
-def view(request, func):
+def view(request, func, seek=None):
     """
     This isn't called directly by anything in urls.py.  Since all the views in
     this module are quite similar, each function marked by @section just
     returns the queryset we should operate on.  The rest of the structure is
     the same.
+
+    ``seek`` is the column the section is sorted on, for paginate(seek=...).
     """
     qs = func(request).exclude(type=amo.ADDON_PERSONA).distinct()
     date_ = date.today()
@@ -138,7 +140,7 @@ def view(request, func):
         if category:
             qs = qs.filter(categories__slug=category)
 
-    addons = amo.utils.paginate(request, qs, per_page=75)
+    addons = amo.utils.paginate(request, qs, per_page=75, seek=seek)
     q = addons.object_list
     cache_key = '%s%s' % (q.query, date_)
     f = lambda: attach_stats(request, q, date_)
@@ -153,13 +155,14 @@ def view(request, func):
 _sections = []
 
 
-def section(title):
+def section(title, seek=None):
     """
     Add the title and function to _sections and return a wrapper that calls
-    ``view`` with the decorated function.
+    ``view`` with the decorated function.  Pass ``seek`` if the queryset is
+    sorted on a column that can be paged by keyset.
     """
     def decorator(func):
-        v = lambda request: view(request, func)
+        v = lambda request: view(request, func, seek)
         _sections.append((v, title))
         return v
     return decorator
@@ -181,6 +184,6 @@ def combo(request):
     return o.featured(request.APP) | o.category_featured()
 
 
-@section('Popular')
+@section('Popular', seek='-weekly_downloads')
 def popular(request):
     return Addon.objects.order_by('-weekly_downloads')
@@ -32,7 +32,7 @@ class Review(TranslatedFieldMixin, amo.models.ModelBase):
             return []
 
         rv = {}
-        ts = Translation.objects.filter(id__in=ids)
+        ts = Translation.objects.filter(id__in=ids).order_by('id')
 
         # If a translation exists for the current language, use it.  Otherwise,
         # make do with whatever is available.  (Reviewers only write reviews in
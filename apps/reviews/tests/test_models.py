@@ -1,9 +1,12 @@
 from django import test
 from django.utils import translation
 
+import mock
+from nose.tools import eq_
 from test_utils import trans_eq
 
 from reviews.models import Review
+from translations.models import Translation
 
 
 class TestReviewModel(test.TestCase):
@@ -29,3 +32,45 @@ class TestReviewModel(test.TestCase):
         # There's only a de translation, so we get that.
         r2 = Review.objects.get(id=2)
         trans_eq(r2.title, 'r2 title de', 'de')
+
+    def test_batch_translations(self):
+        translation.activate('en-US')
+        fetch = 'reviews.models.Review._set_translated_fields'
+        with mock.patch(fetch) as set_translated_fields:
+            r1, r2 = Review.objects.no_cache().order_by('id')
+            assert not set_translated_fields.called
+        trans_eq(r1.title, 'r1 title en', 'en-US')
+        trans_eq(r2.title, 'r2 title de', 'de')
+
+        # Reviews made outside a queryset still fetch their own.
+        r = Review(title_id=r1.title_id, body_id=r1.body_id)
+        trans_eq(r.title, 'r1 title en', 'en-US')
+
+    def test_batches_are_chunked(self):
+        translation.activate('en-US')
+        fetch = 'reviews.models.Review.fetch_translations'
+        with mock.patch('amo.models.TRANSFORM_BATCH_SIZE', 1):
+            with mock.patch(fetch) as fetch_translations:
+                fetch_translations.return_value = []
+                reviews = list(Review.objects.no_cache().iterator())
+        # One fetch per batch of one.
+        assert len(reviews) > 1
+        eq_(fetch_translations.call_count, len(reviews))
+
+    def test_batch_mixed_locales(self):
+        translation.activate('en-US')
+        # Rows for the same id aren't next to each other in the table.
+        for id, locale in ((90, 'en-US'), (91, 'de'), (92, 'de'),
+                           (90, 'de'), (92, 'en-US'), (91, 'fr')):
+            Translation.objects.create(id=id, locale=locale,
+                                       localized_string='%s %s' % (id, locale))
+        r = Review.objects.get(id=1)
+        for id in (90, 91, 92):
+            Review.objects.create(version_id=r.version_id, user_id=r.user_id,
+                                  title_id=id)
+
+        reviews = Review.objects.no_cache().filter(title__in=[90, 91, 92])
+        titles = dict((r.title_id, r.title) for r in reviews)
+        trans_eq(titles[90], '90 en-US', 'en-US')
+        assert titles[91].locale in ('de', 'fr')
+        trans_eq(titles[92], '92 en-US', 'en-US')
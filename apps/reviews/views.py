@@ -13,7 +13,7 @@ def review_list(request, addon_id):
     addon = get_object_or_404(Addon, id=addon_id)
 
     versions = Version.objects.filter(addon=addon)
-    q = Review.objects.filter(version__in=versions).order_by('-created')
-    reviews = amo.utils.paginate(request, q)
+    q = Review.objects.filter(version__in=versions)
+    reviews = amo.utils.paginate(request, q, seek='-created')
     return jingo.render(request, 'reviews/review_list.html',
                         {'addon': addon, 'reviews': reviews})
@@ -1,24 +1,25 @@
 from collections import defaultdict
+import hashlib
 import random
 import re
 import socket
 
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import translation
-from django.utils.encoding import smart_unicode
+from django.utils.encoding import smart_str, smart_unicode
 
 import commonware.log
 import sphinxapi as sphinx
 
 import amo
-from amo.models import manual_order
-from addons.models import Addon, Category
+from addons.models import Addon
 from bandwagon.models import Collection
-from translations.query import order_by_translation
 from translations.transformer import get_trans
-from tags.models import Tag
 
-from .utils import convert_version, crc32
+from . import lookups, timing
+from .pool import get_pool
+from .utils import convert_version, crc32, index_generation
 
 m_dot_n_re = re.compile(r'^\d+\.\d+$')
 SEARCH_ENGINE_APP = 99
@@ -26,6 +27,13 @@ BIG_INTEGER = 10000000    # Used for SetFilterRange
 MAX_TAGS = 10             # Number of tags we return by default.
 SPHINX_HARD_LIMIT = 1000  # A hard limit that sphinx imposes.
 THE_FUTURE = 9999999999
+# Add-ons live in a main index plus a delta of recent changes.  Sphinx lets
+# the later index win when a document is in both.
+ADDONS_INDEXES = 'addons addons_delta'
+# sphinxapi errors for a reply cut short, which is how a pooled connection
+# searchd has closed usually shows up.
+READ_ERRORS = ('failed to read searchd response',
+               'received zero-sized searchd response', 'incomplete reply')
 
 log = commonware.log.getLogger('z.sphinx')
 
@@ -102,11 +110,7 @@ def extract_filters(term, kwargs):
     (term, tag) = extract_from_query(term, 'tag', '\w+', kwargs)
 
     if tag:
-        tag = Tag.objects.filter(tag_text=tag)[:1]
-        if tag:
-            metas['tag'] = tag[0].id
-        else:
-            metas['tag'] = -1
+        metas['tag'] = lookups.get_tag_id(tag) or -1
 
     # TODO:
     # In the interest of having working code sooner than later, we're
@@ -122,6 +126,11 @@ def get_locale_ord():
                  or translation.get_language())
 
 
+def listing_addons():
+    """Add-ons with only the translations a results page draws."""
+    return Addon.objects.only_translations(*Addon.LISTING_TRANSLATIONS)
+
+
 class ResultSet(object):
     """
     ResultSet wraps around a query set and provides meta data used for
@@ -153,12 +162,10 @@ def get_category_id(category, application):
     """
     Given a string, get the category id associated with it.
     """
-    category = Category.objects.filter(
-            slug__istartswith=category,
-            application=application)[:1]
-
-    if len(category):
-        return category[0].id
+    category = category.lower()
+    for slug, id in lookups.category_slugs.get(application, []):
+        if slug.startswith(category):
+            return id
 
 
 def sanitize_query(term):
@@ -204,34 +211,131 @@ class Client(object):
         self.queries = {}
         self.query_index = 0
         self.meta_filters = {}
+        # What kind of query this is, for the timing histograms.
+        self.shape = ''
 
         # TODO(davedash): make this less arbitrary
         # Unique ID used for logging
         self.id = int(random.random() * 10**5)
 
-    def get_result_set(self, term, result, offset, limit):
-        # Remove transformations for now so we can pull them in later.
-        qs = Addon.objects.all()
-        transforms = qs._transform_fns
-        qs._transform_fns = []
+    def run(self, fn, *args):
+        """Time a sphinx round trip; see ``_run``."""
+        with timing.timer('sphinx', self.shape, self.id):
+            return self._run(fn, *args)
 
-        # Return results as a list of add-ons.
-        addon_ids = [m['attrs']['addon_id'] for m in result['matches']]
-        addons = []
-        for addon_id in addon_ids:
+    def _run(self, fn, *args):
+        """
+        Call ``fn`` (``RunQueries`` or ``Query``) over a pooled persistent
+        connection and hand the connection back afterwards.
+
+        If a reused connection breaks we retry once on a fresh one.  A
+        connection searchd has closed usually fails while reading the reply,
+        with a socket error, a short read that trips up ``unpack``, or an
+        empty response, so all of those count.  Timeouts aren't retried;
+        that would only pile more load onto a slow searchd.
+        """
+        sc, pool = self.sphinx, get_pool()
+        reqs = sc._reqs
+        for attempt in (1, 2):
+            sc._reqs = list(reqs)
+            sc._error = ''
+            sc._socket = pool.get()
+            if not sc._socket:
+                log.error("Could not connect to sphinx.")
+                raise SearchError("Could not connect to sphinx.")
             try:
-                addons.append(qs.get(pk=addon_id))
-            except Addon.DoesNotExist:  # pragma: no cover
-                log.warn(u'%d: Result for %s refers to non-existent '
-                         'addon: %d' % (self.id, term, addon_id))
+                rv = fn(*args)
+            except socket.timeout:
+                pool.discard(sc._socket)
+                log.error("Query has timed out.")
+                raise SearchError("Query has timed out.")
+            except Exception, e:
+                pool.discard(sc._socket)
+                if attempt == 1:
+                    log.warning('%d: Reconnecting to sphinx: %s' %
+                                (self.id, e))
+                    continue
+                log.error("Sphinx threw an unknown exception: %s" % e)
+                raise SearchError("Sphinx threw an unknown exception.")
+            finally:
+                sock, sc._socket = sc._socket, None
+
+            error = sc.GetLastError()
+            if sock and not error:
+                pool.put(sock)
+                return rv
+            pool.discard(sock)
+            if attempt == 1 and error.startswith(READ_ERRORS):
+                log.warning('%d: Reconnecting to sphinx: %s' %
+                            (self.id, error))
+                continue
+            return rv
+
+    def add_primary_query(self, term, index):
+        self.sphinx.AddQuery(term, index)
+        self.queries['primary'] = self.query_index
+        self.query_index += 1
 
-        # Do the transforms now that we have all the add-ons.
-        for fn in transforms:
-            fn(addons)
+    def primary_result(self, results):
+        """Pull out our query's result; a failed query is a SearchError."""
+        self.record_query_times(results)
+        result = results[self.queries['primary']]
+        if result.get('error'):
+            raise SearchError(result['error'])
+        self.total_found = result.get('total_found', 0)
+        return result
+
+    def record_query_times(self, results):
+        """Record searchd's own time for our primary and meta queries."""
+        meta = 0
+        for name, index in self.queries.items():
+            ms = float(results[index].get('time') or 0) * 1000
+            if name == 'primary':
+                timing.record('sphinx.primary', ms, self.shape, self.id)
+            else:
+                meta += ms
+        if len(self.queries) > 1:
+            timing.record('sphinx.meta', meta, self.shape, self.id)
+
+    def get_result_set(self, term, result, offset, limit):
+        # Pull the add-ons in one query; transforms run over the whole batch.
+        addon_ids = [m['attrs']['addon_id'] for m in result['matches']]
+        addons = self.hydrate(listing_addons(), addon_ids, term)
 
         return ResultSet(addons, min(self.total_found, SPHINX_HARD_LIMIT),
                          offset)
 
+    def hydrate(self, qs, ids, term=None):
+        """
+        Fetch the objects for ``ids`` with a single ``id__in`` query and
+        return them in the same order as ``ids``.
+
+        Ids that sphinx knows about but the database doesn't (stale index
+        entries) are logged and skipped.  The queryset's transforms are run
+        once over the ordered list instead of once per object.
+        """
+        if not ids:
+            return []
+
+        transforms, qs = qs.pop_transforms()
+        with timing.timer('hydrate', self.shape, self.id):
+            objects = dict((obj.id, obj) for obj in qs.filter(id__in=ids))
+
+        rv = []
+        for pk in ids:
+            if pk in objects:
+                rv.append(objects[pk])
+            else:
+                log.warn(u'%d: Result for %s refers to non-existent '
+                         '%s: %d' % (self.id, term, qs.model._meta.module_name,
+                                     pk))
+
+        with timing.timer('transforms', self.shape, self.id):
+            for fn in transforms:
+                fn(rv)
+
+        return rv
+
     def log_query(self, term=None):
         """
         Logs whatever relevant data we can from sphinx.
@@ -301,7 +405,7 @@ class Client(object):
         # out all of the possible values of this particular field after we
         # filter down the search.
         filters = self.apply_meta_filters(exclude=field)
-        self.sphinx.AddQuery(term, 'addons')
+        self.sphinx.AddQuery(term, ADDONS_INDEXES)
 
         # We roll back our client and store a pointer to this filter.
         self.remove_filters(len(filters))
@@ -341,7 +445,25 @@ class Client(object):
 
     def query(self, term, limit=10, offset=0, **kwargs):
         """
-        Queries sphinx for a term, and parses specific options.
+        Queries sphinx for a term, and parses specific options.  See
+        ``prepare`` for the options.
+        """
+        cached = self.prepare(term, limit, offset, **kwargs)
+        if cached is not None:
+            return cached
+
+        results = self.run(self.sphinx.RunQueries)
+
+        if self.sphinx.GetLastError():
+            raise SearchError(self.sphinx.GetLastError())
+
+        return self.finish(results)
+
+    def prepare(self, term, limit=10, offset=0, **kwargs):
+        """
+        Add the sphinx queries for a search with ``AddQuery`` and remember
+        what ``finish`` needs to turn the results into add-ons.  Returns the
+        results straight away if they were cached, otherwise None.
 
         The following kwargs will do things:
 
@@ -367,8 +489,37 @@ class Client(object):
         sc.SetFieldWeights({'name': 4})
 
         # Extract and apply various filters.
-        (term, includes, excludes, ranges, metas) = extract_filters(
-                term, kwargs)
+        with timing.timer('filters', client_id=self.id) as timer:
+            (term, includes, excludes, ranges, metas) = extract_filters(
+                    term, kwargs)
+
+            # Sanitize the term before we start adding queries.
+            term = sanitize_query(term)
+
+            used = includes.keys() + ranges.keys() + metas.keys()
+            if kwargs.get('version'):
+                used.append('version')
+            self.shape = timer.shape = timing.get_shape(
+                'addons', kwargs.get('sort'), used)
+
+        # Identical searches are served from the cache until the indexes are
+        # rotated.  Facets don't depend on paging, sorting or the version
+        # filter so they're cached on their own.
+        filters = (includes, excludes, ranges, metas)
+        cache_key = self.cache_key('page', term, *filters, limit=limit,
+                                   offset=offset,
+                                   version=kwargs.get('version'),
+                                   sort=kwargs.get('sort'))
+        facet_key = self.cache_key('facets', term, *filters,
+                                   meta=kwargs.get('meta'))
+        meta_wanted = kwargs.get('meta', ())
+        cached = cache.get_many([cache_key, facet_key])
+        page = cached.get(cache_key)
+        meta = cached.get(facet_key) if meta_wanted else {}
+
+        if page is not None and meta is not None:
+            self.set_meta(meta, kwargs)
+            return self.from_cache(term, page, offset)
 
         for filter, value in includes.iteritems():
             self.add_filter(filter, value)
@@ -382,22 +533,21 @@ class Client(object):
         for filter, value in metas.iteritems():
             self.add_filter(filter, value, meta=True)
 
-        # Sanitize the term before we start adding queries.
-        term = sanitize_query(term)
-
         # Meta queries serve aggregate data we might want.  Such as filters
-        # that the end-user may want to apply to their query.
-        if 'meta' in kwargs:
+        # that the end-user may want to apply to their query.  We skip them
+        # if the facets were cached.
+        compute_meta = meta_wanted and meta is None
+        if compute_meta:
             sc.SetLimits(0, 10000)
 
-            if 'versions' in kwargs['meta']:
+            if 'versions' in meta_wanted:
                 self.add_meta_query('max_ver', term)
                 self.add_meta_query('min_ver', term)
 
-            if 'categories' in kwargs['meta']:
+            if 'categories' in meta_wanted:
                 self.add_meta_query('category', term)
 
-            if 'tags' in kwargs['meta']:
+            if 'tags' in meta_wanted:
                 sc.SetFilterRange('tag', 0, BIG_INTEGER)
                 self.add_filter('locale_ord', get_locale_ord())
                 self.add_meta_query('tag', term)
@@ -439,27 +589,31 @@ class Client(object):
 
         sc.SetLimits(min(offset, SPHINX_HARD_LIMIT - 1), limit)
 
-        sc.AddQuery(term, 'addons')
+        sc.AddQuery(term, ADDONS_INDEXES)
         self.queries['primary'] = self.query_index
         self.query_index += 1
 
         self.log_query(term)
 
-        try:
-            results = sc.RunQueries()
-        except socket.timeout:
-            log.error("Query has timed out.")
-            raise SearchError("Query has timed out.")
-        except Exception, e:
-            log.error("Sphinx threw an unknown exception: %s" % e)
-            raise SearchError("Sphinx threw an unknown exception.")
-
-        if sc.GetLastError():
-            raise SearchError(sc.GetLastError())
-
-        # Handle any meta data we have.
-        if 'meta' in kwargs:
-            if 'versions' in kwargs['meta']:
+        self.pending = dict(term=term, offset=offset, limit=limit,
+                            kwargs=kwargs, cache_key=cache_key,
+                            facet_key=facet_key, meta=meta,
+                            meta_wanted=meta_wanted,
+                            compute_meta=compute_meta)
+
+    def finish(self, results):
+        """Turn the ``RunQueries`` results into add-ons and facets."""
+        p = self.pending
+        term, offset, limit, kwargs = (p['term'], p['offset'], p['limit'],
+                                       p['kwargs'])
+        meta, meta_wanted = p['meta'], p['meta_wanted']
+        self.record_query_times(results)
+
+        # Handle any meta data we have.  We only keep ids around so they can
+        # be cached; objects are attached in set_meta.
+        if p['compute_meta']:
+            meta = {}
+            if 'versions' in meta_wanted:
                 # We don't care about the first 10 digits, since
                 # those deal with alpha/preview/etc
                 result = results[self.queries['min_ver']]
@@ -478,31 +632,19 @@ class Client(object):
                             if m['attrs']['max_ver'] != 10 ** 13 - 1]
                 versions = list(set(min_vers + max_vers))
                 sorted(versions, reverse=True)
-                self.meta['versions'] = [v for v in versions
-                                         if v not in (0, 10 ** 13)]
+                meta['versions'] = [v for v in versions
+                                    if v not in (0, 10 ** 13)]
 
-            if 'categories' in kwargs['meta']:
+            if 'categories' in meta_wanted:
                 result = results[self.queries['category']]
                 category_ids = []
 
                 for m in result['matches']:
                     category_ids.extend(m['attrs']['category'])
 
-                category_ids = set(category_ids)
-                categories = []
-
-                if category_ids:
-
-                    qs = Category.objects.filter(id__in=set(category_ids))
-
-                    if 'app' in kwargs:
-                        qs = qs.filter(application=kwargs['app'])
+                meta['categories'] = list(set(category_ids))
 
-                    categories = order_by_translation(qs, 'name')
-
-                self.meta['categories'] = categories
-
-            if 'tags' in kwargs['meta']:
+            if 'tags' in meta_wanted:
                 result = results[self.queries['tag']]
                 tag_dict = defaultdict(int)
 
@@ -511,8 +653,11 @@ class Client(object):
                         tag_dict[tag_id] += 1
                 tag_dict_sorted = sorted(tag_dict.iteritems(),
                         key=lambda x: x[1], reverse=True)[:MAX_TAGS]
-                tag_ids = [k for k, v in tag_dict_sorted]
-                self.meta['tags'] = manual_order(Tag.objects.all(), tag_ids)
+                meta['tags'] = [k for k, v in tag_dict_sorted]
+
+            cache.set(p['facet_key'], meta, settings.SEARCH_CACHE_TIMEOUT)
+
+        self.set_meta(meta, kwargs)
 
         result = results[self.queries['primary']]
         self.total_found = result.get('total_found', 0) if result else 0
@@ -522,37 +667,81 @@ class Client(object):
             return []  # Fail silently.
 
         if result and result['total']:
+            addon_ids = [m['attrs']['addon_id'] for m in result['matches']]
+        else:
+            addon_ids = []
+
+        cache.set(p['cache_key'], {'total_found': self.total_found,
+                                   'ids': addon_ids},
+                  settings.SEARCH_CACHE_TIMEOUT)
+
+        if addon_ids:
             return self.get_result_set(term, result, offset, limit)
         else:
             return []
 
+    def cache_key(self, prefix, term, *filters, **options):
+        """
+        Build a cache key from the normalized term, every filter
+        extract_filters produced and the paging/sort ``options``.  The
+        locale ord is included because it feeds the relevance weight and the
+        tag facets.
+        """
+        normalize = lambda d: sorted((k, v) for k, v in d.items())
+        key = (u' '.join(term.lower().split()),
+               [normalize(f) for f in filters],
+               normalize(options), get_locale_ord())
+        return '%ssearch:%s:%s:%s' % (settings.CACHE_PREFIX, prefix,
+                                      index_generation(),
+                                      hashlib.md5(smart_str(key)).hexdigest())
+
+    def from_cache(self, term, cached, offset):
+        """Rebuild the results of a query from a cached entry."""
+        log.debug('%d Cache hit for %s' % (self.id, smart_unicode(term)))
+        self.total_found = cached['total_found']
+        if not cached['ids']:
+            return []
+        addons = self.hydrate(listing_addons(), cached['ids'], term)
+        return ResultSet(addons, min(self.total_found, SPHINX_HARD_LIMIT),
+                         offset)
+
+    def set_meta(self, meta, kwargs):
+        """
+        Turn the facet ids in ``meta`` into objects on ``self.meta``.  The
+        objects come from in-process lookup tables, not the database.
+        """
+        if 'versions' in meta:
+            self.meta['versions'] = meta['versions']
+
+        if 'categories' in meta:
+            self.meta['categories'] = lookups.get_categories(
+                meta['categories'], kwargs.get('app'))
+
+        if 'tags' in meta:
+            self.meta['tags'] = lookups.get_tags(meta['tags'])
+
 
 class PersonasClient(Client):
     """A search client that queries sphinx for Personas."""
 
-    def query(self, term, limit=10, offset=0, **kwargs):
+    def prepare(self, term, limit=10, offset=0, **kwargs):
         sc = self.sphinx
+        self.shape = timing.get_shape('personas')
         sc.SetSelect('addon_id')
         sc.SetLimits(min(offset, SPHINX_HARD_LIMIT - 1), limit)
         term = sanitize_query(term)
         self.log_query(term)
 
-        try:
-            result = sc.Query(term, 'personas')
-        except socket.timeout:
-            log.error("Query has timed out.")
-            raise SearchError("Query has timed out.")
-        except Exception, e:
-            log.error("Sphinx threw an unknown exception: %s" % e)
-            raise SearchError("Sphinx threw an unknown exception.")
+        self.add_primary_query(term, 'personas')
+        self.pending = dict(term=term, offset=offset, limit=limit)
 
-        if sc.GetLastError():
-            raise SearchError(sc.GetLastError())
-
-        self.total_found = result['total_found'] if result else 0
+    def finish(self, results):
+        p = self.pending
+        result = self.primary_result(results)
 
         if result and result['total']:
-            return self.get_result_set(term, result, offset, limit)
+            return self.get_result_set(p['term'], result, p['offset'],
+                                       p['limit'])
         else:
             return []
 
@@ -560,8 +749,9 @@ class PersonasClient(Client):
 class CollectionsClient(Client):
     """A search client that queries sphinx for Collections."""
 
-    def query(self, term, limit=10, offset=0, **kwargs):
+    def prepare(self, term, limit=10, offset=0, **kwargs):
         sc = self.sphinx
+        self.shape = timing.get_shape('collections', kwargs.get('sort'))
         sc.SetSelect("collection_id")
 
         sc.SetLimits(min(offset, SPHINX_HARD_LIMIT - 1), limit)
@@ -590,41 +780,77 @@ class CollectionsClient(Client):
 
         self.log_query(term)
 
-        try:
-            result = sc.Query(term, 'collections')
-        except socket.timeout:
-            log.error("Query has timed out.")
-            raise SearchError("Query has timed out.")
-        except Exception, e:
-            log.error("Sphinx threw an unknown exception: %s" % e)
-            raise SearchError("Sphinx threw an unknown exception.")
+        self.add_primary_query(term, 'collections')
+        self.pending = dict(term=term, offset=offset)
 
-        if sc.GetLastError():
-            raise SearchError(sc.GetLastError())
-
-        self.total_found = result['total_found'] if result else 0
+    def finish(self, results):
+        p = self.pending
+        result = self.primary_result(results)
 
         if result and result['total']:
-            qs = Collection.objects.all()
-            transforms = qs._transform_fns
-            qs._transform_fns = []
-
-            collection_ids = (m['attrs']['collection_id'] for m
-                              in result['matches'])
-            collections = []
-
-            for collection_id in collection_ids:
-                try:
-                    collections.append(qs.get(pk=collection_id))
-                except Collection.DoesNotExist:  # pragma: no cover
-                    log.warn(u'%d: Result for %s refers to non-existent '
-                             'addon: %d' % (self.id, term, collection_id))
-
-            for fn in transforms:
-                fn(collections)
+            collection_ids = [m['attrs']['collection_id'] for m
+                              in result['matches']]
+            collections = self.hydrate(Collection.objects.all(),
+                                       collection_ids, p['term'])
 
             return ResultSet(collections,
-                             min(self.total_found, SPHINX_HARD_LIMIT), offset)
+                             min(self.total_found, SPHINX_HARD_LIMIT),
+                             p['offset'])
 
         else:
             return []
+
+
+class FederatedClient(Client):
+    """
+    Searches add-ons, personas and collections together.  Every client's
+    queries are batched into a single ``RunQueries`` round trip to searchd.
+
+        client = FederatedClient()
+        results = client.query('fox', addons={'app': 1}, collections={})
+        results['addons'], client.totals['collections']
+    """
+    types = (('addons', Client), ('personas', PersonasClient),
+             ('collections', CollectionsClient))
+
+    def query(self, term, limit=10, offset=0, **options):
+        """
+        ``options`` maps a type name to the keyword arguments for that
+        client's query; only the types given are searched.  With no options
+        all of them are searched.  Returns ``{type: results}`` and sets
+        ``self.totals`` to ``{type: total found}``.
+        """
+        if not options:
+            options = dict((name, {}) for name, _ in self.types)
+
+        sc = self.sphinx
+        self.shape = timing.get_shape('federated', filters=options)
+        self.clients, self.totals, rv = {}, {}, {}
+        pending, index = [], 0
+        for name, cls in self.types:
+            if name not in options:
+                continue
+            client = self.clients[name] = cls()
+            # Results come back in one list, so each client numbers its
+            # queries from where the batch is up to.
+            client.query_index = index
+            cached = client.prepare(term, limit, offset, **options[name])
+            if cached is not None:
+                rv[name] = cached
+            else:
+                sc._reqs.extend(client.sphinx._reqs)
+                client.sphinx._reqs = []
+                index = client.query_index
+                pending.append(client)
+
+        if pending:
+            results = self.run(sc.RunQueries)
+
+            if sc.GetLastError():
+                raise SearchError(sc.GetLastError())
+
+        for name, client in self.clients.items():
+            if client in pending:
+                rv[name] = client.finish(results)
+            self.totals[name] = client.total_found
+        return rv
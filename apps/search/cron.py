@@ -0,0 +1,36 @@
+from django.db import connection, transaction
+
+import commonware.log
+import cronjobs
+
+from . import utils
+
+log = commonware.log.getLogger('z.cron')
+
+
+@cronjobs.register
+def sphinx_delta():
+    """Reindex add-ons changed since the main addons index was built."""
+    log.debug('Building the addons delta index.')
+    utils.index_delta()
+
+
+@cronjobs.register
+def sphinx_merge_delta():
+    """Merge the addons delta index into the main index."""
+    log.debug('Merging the addons delta index.')
+    utils.merge_delta()
+
+
+@cronjobs.register
+def sphinx_prune_deletions():
+    """Drop logged deletions that the main addons index already reflects."""
+    try:
+        indexed = open(utils.MAIN_INDEXED_FILE).read().strip()
+    except IOError:
+        return
+    log.debug('Pruning search deletions before %s.' % indexed)
+    cursor = connection.cursor()
+    cursor.execute('DELETE FROM search_deletions WHERE created < %s',
+                   [indexed])
+    transaction.commit_unless_managed()
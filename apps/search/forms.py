@@ -7,8 +7,8 @@ from django.forms.util import ErrorDict
 from tower import ugettext as _, ugettext_lazy as _lazy
 
 import amo
-from amo import helpers
-from applications.models import AppVersion
+
+from . import lookups
 
 types = (amo.ADDON_ANY, amo.ADDON_EXTENSION, amo.ADDON_THEME,
          amo.ADDON_DICT, amo.ADDON_SEARCH, amo.ADDON_LPAPP)
@@ -58,9 +58,8 @@ min_version.update({
 
 
 def get_app_versions(app):
-    appversions = AppVersion.objects.filter(application=app.id)
     min_ver, skip = min_version[app], skip_versions[app]
-    versions = [(a.major, a.minor1) for a in appversions]
+    versions = lookups.app_versions.get(app.id, [])
     strings = ['%s.%s' % v for v in sorted(set(versions), reverse=True)
                if v >= min_ver and v not in skip]
 
@@ -75,7 +74,7 @@ def get_search_groups(app):
     sub = []
     for type_ in (amo.ADDON_DICT, amo.ADDON_SEARCH, amo.ADDON_THEME):
         sub.append(_Cat(0, amo.ADDON_TYPES[type_], 0, type_))
-    sub.extend(helpers.sidebar(app)[0])
+    sub.extend(lookups.get_sidebar_categories(app))
     sub = [('%s,%s' % (a.type_id, a.id), a.name) for a in
            sorted(sub, key=lambda x: (x.weight, x.name))]
     top_level = [('all', _('all add-ons')),
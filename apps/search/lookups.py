@@ -0,0 +1,156 @@
+"""
+Process-level lookup tables for search.
+
+Building a search request, its facets and the search form needs a handful of
+small, slowly changing tables (categories, tags, app versions).  Rather than
+querying them on every search we keep them in memory for
+``settings.SEARCH_LOOKUP_TIMEOUT`` seconds.  Saving or deleting one of those
+objects clears the affected tables in the current process; other processes
+catch up when their entries expire.
+"""
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.utils import translation
+
+import amo
+from amo import helpers
+from addons.models import Category
+from applications.models import AppVersion
+from tags.models import Tag
+from translations.query import order_by_translation
+
+
+class LookupTable(object):
+    """
+    A dict-like table whose entries expire after ``timeout`` seconds.
+
+    ``build`` is called with a list of missing keys and returns a
+    ``{key: value}`` dict, so all the misses for a lookup are filled at once.
+    Keys that ``build`` doesn't return are treated as missing.
+    """
+
+    def __init__(self, build, timeout=None, max_size=10000):
+        self.build = build
+        self.timeout = timeout
+        self.max_size = max_size
+        self._data = {}
+
+    def get_many(self, keys):
+        now = time.time()
+        timeout = (self.timeout if self.timeout is not None
+                   else settings.SEARCH_LOOKUP_TIMEOUT)
+        rv, missing = {}, []
+        for key in keys:
+            if key in self._data and self._data[key][0] > now:
+                rv[key] = self._data[key][1]
+            else:
+                missing.append(key)
+
+        if missing:
+            if len(self._data) + len(missing) > self.max_size:
+                self._data.clear()
+            built = self.build(missing)
+            for key, value in built.items():
+                self._data[key] = (now + timeout, value)
+            rv.update(built)
+        return rv
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def clear(self):
+        self._data.clear()
+
+
+def _categories(keys):
+    rv = {}
+    for app, lang in keys:
+        qs = Category.objects.all()
+        if app is not None:
+            qs = qs.filter(application=app)
+        rv[app, lang] = list(order_by_translation(qs, 'name'))
+    return rv
+
+# (app id, language) => [categories ordered by name]
+categories = LookupTable(_categories)
+
+# tag id => Tag
+tags = LookupTable(lambda ids: dict((t.id, t) for t in
+                                    Tag.objects.filter(id__in=ids)))
+
+
+def _tag_ids(texts):
+    qs = Tag.objects.filter(tag_text__in=texts).values_list('tag_text', 'id')
+    found = dict((text.lower(), id) for text, id in qs)
+    # Unknown tags are remembered too so made up ones don't keep hitting
+    # the database.
+    return dict((text, found.get(text)) for text in texts)
+
+# lowercased tag text => tag id or None
+tag_ids = LookupTable(_tag_ids)
+
+
+def _category_slugs(apps):
+    rv = dict((app, []) for app in apps)
+    qs = (Category.objects.filter(application__in=apps).order_by('id')
+          .values_list('application', 'slug', 'id'))
+    for app, slug, id in qs:
+        rv[app].append((slug.lower(), id))
+    return rv
+
+# app id => [(lowercased category slug, category id)]
+category_slugs = LookupTable(_category_slugs)
+
+
+def _app_versions(apps):
+    rv = dict((app, []) for app in apps)
+    for av in AppVersion.objects.filter(application__in=apps):
+        rv[av.application_id].append((av.major, av.minor1))
+    return rv
+
+# app id => [(major, minor1) for each AppVersion]
+app_versions = LookupTable(_app_versions)
+
+
+def _sidebar_categories(keys):
+    return dict(((app, lang), list(helpers.sidebar(amo.APP_IDS[app])[0]))
+                for app, lang in keys)
+
+# (app id, language) => [categories in the sidebar]
+sidebar_categories = LookupTable(_sidebar_categories)
+
+
+def get_categories(ids, app=None):
+    """Categories in ``ids`` for ``app``, ordered by their translated name."""
+    ids = set(ids)
+    key = (app, translation.get_language())
+    return [c for c in categories.get(key, []) if c.id in ids]
+
+
+def get_tags(ids):
+    """Tags for ``ids``, in the same order."""
+    found = tags.get_many(ids)
+    return [found[i] for i in ids if i in found]
+
+
+def get_tag_id(text):
+    return tag_ids.get(text.lower())
+
+
+def get_sidebar_categories(app):
+    return sidebar_categories.get((app.id, translation.get_language()), [])
+
+
+def clear_on_change(model, *tables):
+    def clear(sender, **kw):
+        for table in tables:
+            table.clear()
+    for signal in (post_save, post_delete):
+        signal.connect(clear, sender=model, weak=False,
+                       dispatch_uid='search.lookups.%s' % model.__name__)
+
+clear_on_change(Tag, tags, tag_ids)
+clear_on_change(Category, categories, category_slugs, sidebar_categories)
+clear_on_change(AppVersion, app_versions)
@@ -0,0 +1,53 @@
+from optparse import make_option
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+
+from addons.models import Addon
+from bandwagon.models import Collection
+from search.client import Client
+
+
+def per_object(qs, ids):
+    """The old way: one primary key query per match."""
+    transforms, qs = qs.pop_transforms()
+    rv = []
+    for pk in ids:
+        try:
+            rv.append(qs.get(pk=pk))
+        except qs.model.DoesNotExist:
+            pass
+    for fn in transforms:
+        fn(rv)
+    return rv
+
+
+class Command(BaseCommand):  # pragma: no cover
+    help = ("Compare hydrating search results one object at a time against "
+            "the bulk id__in path used by search.client.")
+    option_list = BaseCommand.option_list + (
+        make_option('--size', type='int', default=30,
+                    help='Number of results per page.'),
+        make_option('--runs', type='int', default=10,
+                    help='Number of pages to hydrate for each strategy.'),
+    )
+
+    def handle(self, **options):
+        size, runs = options['size'], options['runs']
+        client = Client()
+        for model in (Addon, Collection):
+            ids = list(model.objects.values_list('id', flat=True)[:size])
+            bulk = lambda qs, ids: client.hydrate(qs, ids)
+            for name, fn in (('loop', per_object), ('bulk', bulk)):
+                reset_queries()
+                start = time.time()
+                for _ in xrange(runs):
+                    # Skip cache-machine so both sides hit the database.
+                    fn(model.objects.no_cache(), ids)
+                elapsed = (time.time() - start) / runs
+                queries = (len(connection.queries) / runs if settings.DEBUG
+                           else '?')
+                print '%-10s %s: %.2fms/page, %s queries/page (%d ids)' % (
+                    model.__name__, name, elapsed * 1000, queries, len(ids))
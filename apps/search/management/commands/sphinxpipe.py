@@ -0,0 +1,26 @@
+from optparse import make_option
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from search.xmlpipe import sources
+
+
+class Command(BaseCommand):  # pragma: no cover
+    help = ("Stream the documents for a sphinx source as xmlpipe2.  Used as "
+            "xmlpipe_command in configs/sphinx/sphinx.conf.")
+    args = '|'.join(sorted(sources))
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', type='int', default=1000,
+                    help='Number of objects to load per query.'),
+        make_option('--since', default=None,
+                    help='Only add-ons changed after this time (addons only; '
+                         'for the delta index).'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1 or args[0] not in sources:
+            raise CommandError('Usage: sphinxpipe %s' % self.args)
+        source = sources[args[0]](chunk_size=options['chunk_size'],
+                                  since=options['since'])
+        source.write(sys.stdout)
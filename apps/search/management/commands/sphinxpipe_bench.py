@@ -0,0 +1,77 @@
+from optparse import make_option
+import resource
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+import amo
+from addons.models import Addon
+from applications.models import AppVersion
+from search.xmlpipe import sources
+from versions.models import ApplicationsVersions, Version
+
+
+class Counter(object):
+    """A file-like sink that only counts bytes."""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, s):
+        self.bytes += len(s)
+
+
+def generate(size):
+    """Create ``size`` add-ons with a version that supports Firefox."""
+    appversions = AppVersion.objects.filter(application=amo.FIREFOX.id)
+    lo, hi = appversions.order_by('version_int')[0], appversions.latest('id')
+    for i in xrange(size):
+        addon = Addon.objects.create(
+            type_id=amo.ADDON_EXTENSION, status=amo.STATUS_PUBLIC,
+            guid='sphinxpipe-bench-%s@example.com' % i,
+            name='Benchmark add-on %s' % i,
+            summary='A generated add-on for benchmarking the indexer.',
+            description='Lorem ipsum dolor sit amet ' * 20)
+        version = Version.objects.create(addon=addon, version='1.%s' % i)
+        ApplicationsVersions.objects.create(
+            application_id=amo.FIREFOX.id, version=version, min=lo, max=hi)
+
+
+class Command(BaseCommand):  # pragma: no cover
+    help = ("Measure xmlpipe2 document throughput for the sphinx sources. "
+            "With --generate, a synthetic catalog is added first and rolled "
+            "back afterwards.")
+    option_list = BaseCommand.option_list + (
+        make_option('--generate', type='int', default=0,
+                    help='Number of add-ons to generate.'),
+        make_option('--chunk-size', type='int', action='append',
+                    dest='chunk_sizes',
+                    help='Chunk size to try; can be given more than once.'),
+    )
+
+    @transaction.commit_manually
+    def handle(self, **options):
+        chunk_sizes = options['chunk_sizes'] or [100, 1000]
+        try:
+            if options['generate']:
+                start = time.time()
+                generate(options['generate'])
+                print 'Generated %s add-ons in %.1fs' % (
+                    options['generate'], time.time() - start)
+            for name in sorted(sources):
+                for size in chunk_sizes:
+                    # Read from the default database, where the generated
+                    # catalog lives.
+                    source = sources[name](chunk_size=size, db='default')
+                    out = Counter()
+                    start = time.time()
+                    count = source.write(out)
+                    elapsed = (time.time() - start) or 1e-6
+                    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                    print ('%-12s chunk=%-5s %6d docs %.1fs %.0f docs/s '
+                           '%.2fMB/s maxrss=%.0fMB' % (
+                        name, size, count, elapsed, count / elapsed,
+                        out.bytes / elapsed / 2 ** 20, rss / 1024.))
+        finally:
+            transaction.rollback()
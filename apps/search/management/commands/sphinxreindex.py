@@ -1,8 +1,11 @@
-import os
+import subprocess
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
+from search.utils import (bump_index_generation, indexed_timestamp,
+                          write_timestamp, MAIN_INDEXED_FILE)
+
 
 class Command(BaseCommand): #pragma: no cover
     help = ("Runs the indexer script for sphinx as defined in "
@@ -11,11 +14,21 @@ class Command(BaseCommand): #pragma: no cover
     requires_model_validation = False
 
     def handle(self, **options):
+        started = indexed_timestamp()
         try:
-            os.execvp(settings.SPHINX_INDEXER,
+            rv = subprocess.call(
                 (settings.SPHINX_INDEXER, '--all', '--rotate', '--config',
                 settings.SPHINX_CONFIG_FILE))
 
         except OSError:
             raise CommandError('You appear not to have the %r program '
             'installed or on your path' % settings.SPHINX_INDEXER)
+
+        if rv != 0:
+            raise CommandError('%s exited with status %s' %
+                               (settings.SPHINX_INDEXER, rv))
+
+        # The delta index picks up whatever changed after this.
+        write_timestamp(MAIN_INDEXED_FILE, started)
+        # Cached search results point at the old indexes.
+        bump_index_generation()
@@ -0,0 +1,111 @@
+"""
+A per-process pool of persistent connections to searchd.
+
+sphinxapi opens a new TCP connection for every ``RunQueries`` unless the
+client already holds a socket that was set up with ``Open()``.  The pool keeps
+a few of those persistent sockets around and lends them to
+``search.client.Client`` for the duration of one round trip.
+"""
+import os
+import select
+import socket
+import threading
+import time
+
+from django.conf import settings
+
+import commonware.log
+import sphinxapi as sphinx
+
+log = commonware.log.getLogger('z.sphinx')
+
+
+def is_alive(sock):
+    """
+    Same check as sphinxapi's _Connect: an idle socket we can use is writable
+    and has nothing to read.  A readable socket means searchd hung up.
+    """
+    try:
+        sr, sw, _ = select.select([sock], [sock], [], 0)
+    except (select.error, socket.error, ValueError):
+        return False
+    return len(sr) == 0 and len(sw) == 1
+
+
+def close(sock):
+    try:
+        sock.close()
+    except socket.error:
+        pass
+
+
+class ConnectionPool(object):
+    """
+    Holds up to ``size`` idle persistent connections.  Connections idle for
+    longer than ``idle_timeout`` seconds are closed instead of reused so we
+    don't trip over searchd's own client timeout.
+    """
+
+    def __init__(self, host, port, size=5, idle_timeout=60):
+        self.host, self.port = host, port
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = []  # (socket, last used) pairs.
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """Open a new persistent connection, or None if searchd is down."""
+        sc = sphinx.SphinxClient()
+        sc.SetServer(self.host, self.port)
+        sc.Open()
+        # Take the socket away so SphinxClient.__del__ doesn't close it.
+        sock, sc._socket = sc._socket, None
+        if not sock:
+            log.warning('Could not open a connection to searchd: %s' %
+                        sc.GetLastError())
+        return sock
+
+    def get(self):
+        """Check out a healthy connection, opening a new one if needed."""
+        now = time.time()
+        with self._lock:
+            while self._idle:
+                sock, last_used = self._idle.pop()
+                if now - last_used < self.idle_timeout and is_alive(sock):
+                    return sock
+                close(sock)
+        return self.connect()
+
+    def put(self, sock):
+        """Return a connection that finished its round trip cleanly."""
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((sock, time.time()))
+                return
+        close(sock)
+
+    def discard(self, sock):
+        """Throw away a connection that errored out."""
+        if sock:
+            close(sock)
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sock, _ in idle:
+            close(sock)
+
+
+_pool = {}
+
+
+def get_pool():
+    """Get the pool for this process; forked children get their own."""
+    pid = os.getpid()
+    if pid not in _pool:
+        _pool.clear()
+        _pool[pid] = ConnectionPool(
+            settings.SPHINX_HOST, settings.SPHINX_PORT,
+            size=settings.SPHINX_POOL_SIZE,
+            idle_timeout=settings.SPHINX_POOL_IDLE_TIMEOUT)
+    return _pool[pid]
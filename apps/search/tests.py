@@ -2,9 +2,13 @@
 import os
 import shutil
 import socket
+from StringIO import StringIO
+import struct
+import tempfile
 import time
 import urllib
 
+from django.core.cache import cache
 from django.test import TestCase, client
 from django.utils import translation
 
@@ -20,13 +24,19 @@ import amo
 from amo.urlresolvers import reverse
 from amo.tests.test_helpers import render
 from manage import settings
-from search import forms, views
-from search.utils import start_sphinx, stop_sphinx, reindex, convert_version
+from search import forms, lookups, timing, utils, views, xmlpipe
+from search.pool import ConnectionPool
+from search.utils import (start_sphinx, stop_sphinx, reindex, convert_version,
+                          bump_index_generation)
 from search.client import (Client as SearchClient, CollectionsClient,
-                           PersonasClient, SearchError, get_category_id,
-                           extract_from_query)
+                           FederatedClient, PersonasClient, SearchError,
+                           get_category_id, extract_from_query)
 from addons.models import Addon, Category
+from applications.models import Application
+from bandwagon.models import Collection
 from tags.models import Tag
+from translations.models import Translation
+from translations.query import order_by_translation
 
 
 def test_convert_version():
@@ -130,6 +140,7 @@ def test_sphinx_timeout(sphinx_mock):
         raise cls
 
     sphinx_mock._filters = []
+    sphinx_mock._reqs = []
     sphinx_mock._limit = 10
     sphinx_mock._offset = 0
     sphinx_mock.return_value = sphinx_mock
@@ -152,6 +163,401 @@ def test_sphinx_timeout(sphinx_mock):
     assert_raises(SearchError, cquery, 'xxx')
 
 
+class HydrateTest(test_utils.TestCase):
+    fixtures = ['base/fixtures']
+
+    def test_result_set_keeps_sphinx_order(self):
+        """Add-ons come back in rank order; stale ids are dropped."""
+        ids = [3615, 40, 999999, 1843]
+        result = {'matches': [{'attrs': {'addon_id': i}} for i in ids]}
+        c = SearchClient()
+        c.total_found = len(ids)
+        r = c.get_result_set('', result, 0, 10)
+        eq_([a.id for a in r], [3615, 40, 1843])
+        eq_(r.total, len(ids))
+
+    @mock.patch('addons.models.Addon.transformer')
+    def test_hydrate_runs_transforms_once(self, transformer):
+        addons = SearchClient().hydrate(Addon.objects.all(), [55, 40])
+        eq_([a.id for a in addons], [55, 40])
+        transformer.assert_called_with(addons)
+        eq_(transformer.call_count, 1)
+
+    def test_hydrate_collections(self):
+        ids = [80, 5, 50]
+        collections = SearchClient().hydrate(Collection.objects.all(), ids)
+        eq_([c.id for c in collections], ids)
+
+    def test_hydrate_empty(self):
+        eq_(SearchClient().hydrate(Addon.objects.all(), []), [])
+
+
+class ConnectionPoolTest(TestCase):
+
+    def setUp(self):
+        self.pool = ConnectionPool('127.0.0.1', 3312, size=1, idle_timeout=60)
+        self.pool.connect = Mock(return_value='fresh')
+
+    def test_reuse(self):
+        sock, peer = socket.socketpair()
+        self.pool.put(sock)
+        eq_(self.pool.get(), sock)
+        eq_(self.pool.get(), 'fresh')
+
+    def test_dead_connection(self):
+        sock, peer = socket.socketpair()
+        self.pool.put(sock)
+        # searchd hanging up makes the socket readable.
+        peer.close()
+        eq_(self.pool.get(), 'fresh')
+
+    def test_idle_timeout(self):
+        sock, peer = socket.socketpair()
+        self.pool.put(sock)
+        self.pool._idle = [(sock, time.time() - 61)]
+        eq_(self.pool.get(), 'fresh')
+
+    def test_pool_size(self):
+        socks = [socket.socketpair()[0] for _ in range(2)]
+        for sock in socks:
+            self.pool.put(sock)
+        eq_(len(self.pool._idle), 1)
+
+
+class SearchCacheTest(test_utils.TestCase):
+    fixtures = ['base/fixtures']
+
+    def setUp(self):
+        cache.clear()
+        self.results = [{'matches': [{'attrs': {'addon_id': 3615}},
+                                     {'attrs': {'addon_id': 40}}],
+                         'total': 2, 'total_found': 2, 'error': ''}]
+
+    def tearDown(self):
+        cache.clear()
+
+    def setup_sphinx(self, sphinx_mock, pool_mock):
+        sphinx_mock.return_value = sphinx_mock
+        sphinx_mock._filters = []
+        sphinx_mock._reqs = []
+        sphinx_mock._limit = 10
+        sphinx_mock._offset = 0
+        sphinx_mock.GetLastError.return_value = ''
+        sphinx_mock.RunQueries.return_value = self.results
+        pool_mock.return_value = Mock()
+
+    @mock.patch('search.client.get_pool')
+    @mock.patch('search.client.sphinx.SphinxClient')
+    def test_cache_hit(self, sphinx_mock, pool_mock):
+        self.setup_sphinx(sphinx_mock, pool_mock)
+        eq_([a.id for a in query('cached', sort='newest')], [3615, 40])
+        eq_(sphinx_mock.RunQueries.call_count, 1)
+
+        # The same search (modulo case and spacing) skips sphinx.
+        r = query(' CACHED ', sort='newest')
+        eq_([a.id for a in r], [3615, 40])
+        eq_(r.total, 2)
+        eq_(sphinx_mock.RunQueries.call_count, 1)
+
+        # Different filters go back to sphinx.
+        query('cached', sort='newest', offset=20)
+        eq_(sphinx_mock.RunQueries.call_count, 2)
+
+    @mock.patch('search.client.get_pool')
+    @mock.patch('search.client.sphinx.SphinxClient')
+    def test_facets_cached_across_pages(self, sphinx_mock, pool_mock):
+        self.setup_sphinx(sphinx_mock, pool_mock)
+        max_ver = {'matches': [{'attrs': {'max_ver': 3060000000000}}]}
+        min_ver = {'matches': [{'attrs': {'min_ver': 2000000000000}}]}
+        sphinx_mock.RunQueries.return_value = [max_ver, min_ver] + self.results
+        c = SearchClient()
+        c.query('cached', meta=('versions',))
+        eq_(sorted(c.meta['versions']), [2000000000000, 3060000000000])
+        eq_(sphinx_mock.AddQuery.call_count, 3)
+
+        # A new sort only asks sphinx for the primary query.
+        sphinx_mock.RunQueries.return_value = self.results
+        c = SearchClient()
+        c.query('cached', meta=('versions',), sort='newest')
+        eq_(sorted(c.meta['versions']), [2000000000000, 3060000000000])
+        eq_(sphinx_mock.AddQuery.call_count, 4)
+
+    @mock.patch('search.client.get_pool')
+    @mock.patch('search.client.sphinx.SphinxClient')
+    def test_generation_invalidates(self, sphinx_mock, pool_mock):
+        self.setup_sphinx(sphinx_mock, pool_mock)
+        query('cached')
+        bump_index_generation()
+        query('cached')
+        eq_(sphinx_mock.RunQueries.call_count, 2)
+
+    @mock.patch('search.client.get_pool')
+    @mock.patch('search.client.sphinx.SphinxClient')
+    def test_federated(self, sphinx_mock, pool_mock):
+        self.setup_sphinx(sphinx_mock, pool_mock)
+        personas = {'matches': [{'attrs': {'addon_id': 55}}],
+                    'total': 1, 'total_found': 1, 'error': ''}
+        collections = {'matches': [{'attrs': {'collection_id': 80}}],
+                       'total': 1, 'total_found': 7, 'error': ''}
+        sphinx_mock.RunQueries.return_value = (self.results +
+                                               [personas, collections])
+        client = FederatedClient()
+        r = client.query('cached')
+        eq_(sphinx_mock.RunQueries.call_count, 1)
+        eq_([c[0][1] for c in sphinx_mock.AddQuery.call_args_list],
+            ['addons addons_delta', 'personas', 'collections'])
+        eq_([a.id for a in r['addons']], [3615, 40])
+        eq_([a.id for a in r['personas']], [55])
+        eq_([c.id for c in r['collections']], [80])
+        eq_(client.totals, {'addons': 2, 'personas': 1, 'collections': 7})
+
+        # Cached add-ons stay out of the batch.
+        sphinx_mock.RunQueries.return_value = [personas]
+        r = FederatedClient().query('cached', addons={}, personas={})
+        eq_(sphinx_mock.RunQueries.call_count, 2)
+        eq_([a.id for a in r['addons']], [3615, 40])
+        eq_([a.id for a in r['personas']], [55])
+
+    @mock.patch('search.client.get_pool')
+    @mock.patch('search.client.sphinx.SphinxClient')
+    def test_retry_short_read(self, sphinx_mock, pool_mock):
+        """A stale connection that dies mid-reply is dropped and retried."""
+        self.setup_sphinx(sphinx_mock, pool_mock)
+        results = self.results
+
+        def run():
+            if sphinx_mock.RunQueries.call_count == 1:
+                raise struct.error('unpack requires a string argument')
+            return results
+        sphinx_mock.RunQueries.side_effect = run
+        eq_([a.id for a in query('retry')], [3615, 40])
+        pool = pool_mock.return_value
+        eq_(sphinx_mock.RunQueries.call_count, 2)
+        eq_(pool.discard.call_count, 1)
+        eq_(pool.put.call_count, 1)
+
+    @mock.patch('search.client.get_pool')
+    @mock.patch('search.client.sphinx.SphinxClient')
+    def test_retry_empty_response(self, sphinx_mock, pool_mock):
+        self.setup_sphinx(sphinx_mock, pool_mock)
+        results = self.results
+
+        def run():
+            first = sphinx_mock.RunQueries.call_count == 1
+            sphinx_mock.GetLastError.return_value = (
+                'received zero-sized searchd response' if first else '')
+            return None if first else results
+        sphinx_mock.RunQueries.side_effect = run
+        eq_([a.id for a in query('retry')], [3615, 40])
+        pool = pool_mock.return_value
+        eq_(sphinx_mock.RunQueries.call_count, 2)
+        eq_(pool.discard.call_count, 1)
+        eq_(pool.put.call_count, 1)
+
+
+class LookupTableTest(TestCase):
+
+    def setUp(self):
+        self.build = Mock(side_effect=lambda keys: dict((k, k * 2)
+                                                        for k in keys if k))
+        self.table = lookups.LookupTable(self.build, timeout=60)
+
+    def test_get_many(self):
+        eq_(self.table.get_many([1, 2, 0]), {1: 2, 2: 4})
+        self.build.assert_called_with([1, 2, 0])
+        # Hits don't call build, misses are built together.
+        eq_(self.table.get_many([1, 3]), {1: 2, 3: 6})
+        self.build.assert_called_with([3])
+
+    def test_expiry(self):
+        self.table.get(1)
+        self.table._data[1] = (time.time() - 1, 2)
+        eq_(self.table.get(1), 2)
+        eq_(self.build.call_count, 2)
+
+    def test_max_size(self):
+        self.table.max_size = 2
+        self.table.get_many([1, 2])
+        self.table.get(3)
+        eq_(self.table._data.keys(), [3])
+
+
+class LookupsTest(test_utils.TestCase):
+    fixtures = ['base/category']
+
+    def setUp(self):
+        lookups.categories.clear()
+
+    def test_get_categories(self):
+        cats = Category.objects.filter(application=amo.FIREFOX.id)
+        ids = [c.id for c in cats]
+        eq_(lookups.get_categories(ids, amo.FIREFOX.id),
+            list(order_by_translation(cats, 'name')))
+        eq_(lookups.get_categories([], amo.FIREFOX.id), [])
+
+
+    def test_get_category_id_cached(self):
+        eq_(get_category_id('FEEDS', amo.FIREFOX.id), 1)
+        with mock.patch('search.lookups.Category.objects') as objects:
+            eq_(get_category_id('feeds', amo.FIREFOX.id), 1)
+            eq_(get_category_id('nope', amo.FIREFOX.id), None)
+            assert not objects.filter.called
+
+    def test_get_tag_id(self):
+        tag = Tag.objects.create(tag_text='Lookup')
+        eq_(lookups.get_tag_id('lookup'), tag.id)
+        eq_(lookups.get_tag_id('nope'), None)
+        with mock.patch('search.lookups.Tag.objects') as objects:
+            eq_(lookups.get_tag_id('LOOKUP'), tag.id)
+            eq_(lookups.get_tag_id('nope'), None)
+            assert not objects.filter.called
+
+    def test_clear_on_save(self):
+        eq_(lookups.get_tag_id('fresh'), None)
+        tag = Tag.objects.create(tag_text='fresh')
+        eq_(lookups.get_tag_id('fresh'), tag.id)
+
+
+class DeltaIndexTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.files = utils.MAIN_INDEXED_FILE, utils.DELTA_INDEXED_FILE
+        self.main = utils.MAIN_INDEXED_FILE = os.path.join(self.dir, 'main')
+        self.delta = utils.DELTA_INDEXED_FILE = os.path.join(self.dir, 'delta')
+        utils.write_timestamp(self.main, '2010-01-01 00:00:00')
+        utils.write_timestamp(self.delta, '2010-01-02 00:00:00')
+
+    def tearDown(self):
+        utils.MAIN_INDEXED_FILE, utils.DELTA_INDEXED_FILE = self.files
+        shutil.rmtree(self.dir)
+
+    def read(self, path):
+        return open(path).read()
+
+    @mock.patch('search.utils.subprocess.call')
+    def test_merge(self, call):
+        call.return_value = 0
+        utils.merge_delta()
+        # The main index picks up where the merged delta left off, and a
+        # fresh delta is built.
+        eq_(self.read(self.main), '2010-01-02 00:00:00')
+        assert self.read(self.delta) > '2010-01-02 00:00:00'
+        eq_([c[0][0][3:] for c in call.call_args_list],
+            [['--merge', 'addons', 'addons_delta', '--merge-killlists',
+              '--rotate'],
+             ['addons_delta', '--rotate']])
+
+    @mock.patch('search.utils.subprocess.call')
+    def test_failed_merge(self, call):
+        call.return_value = 1
+        utils.merge_delta()
+        eq_(self.read(self.main), '2010-01-01 00:00:00')
+        eq_(self.read(self.delta), '2010-01-02 00:00:00')
+
+
+class XmlPipeTest(TestCase):
+
+    def test_document(self):
+        out = StringIO()
+        pipe = xmlpipe.XmlPipe(out)
+        pipe.start(['name'], [('addon_id', 'int'), ('tag', 'multi')])
+        pipe.document(1, {'name': u'<b>\u2603\x00</b>', 'addon_id': 3,
+                          'tag': [3, 1, 3]})
+        pipe.end([5])
+        doc = pq(out.getvalue().replace('sphinx:', ''))
+        eq_(doc('document').attr('id'), '1')
+        eq_(doc('document name').text(), u'<b>\u2603</b>')
+        eq_(doc('document tag').text(), '1 3')
+        eq_(doc('killlist id').text(), '5')
+
+    def test_pk_ranges(self):
+        qs = Mock()
+        qs.aggregate.return_value = {'lo': 3, 'hi': 10}
+        eq_(list(xmlpipe.pk_ranges(qs, 4)), [(3, 7), (7, 11)])
+        qs.aggregate.return_value = {'lo': None, 'hi': None}
+        eq_(list(xmlpipe.pk_ranges(qs, 4)), [])
+
+
+class XmlPipeSourceTest(test_utils.TestCase):
+    fixtures = ['base/fixtures']
+
+    def test_chunks_match(self):
+        """Chunking doesn't change which documents come out."""
+        docs = lambda size: sorted(xmlpipe.AddonSource(chunk_size=size,
+                                                       db='default')
+                                   .documents())
+        big = docs(100000)
+        assert big
+        eq_(docs(7), big)
+        assert 3615 in [d['addon_id'] for _, d in big]
+        assert amo.ADDON_PERSONA not in [d['type'] for _, d in big]
+
+    @mock.patch('search.xmlpipe.AddonSource.deletions')
+    def test_killlist(self, deletions):
+        """Deleted add-ons lose every id their name could have had."""
+        name = Addon.objects.get(id=3615).name_id
+        # Nothing changed since then, but add-on 999 was deleted.
+        deletions.return_value = [(999, name)]
+        source = xmlpipe.AddonSource(since='2100-01-01', db='default')
+        list(source.documents())
+        apps = [0] + list(Application.objects.values_list('id', flat=True))
+        autoids = Translation.objects.filter(id=name).values_list('autoid',
+                                                                  flat=True)
+        assert autoids
+        assert set(autoid * 100 + app for autoid in autoids
+                   for app in apps) <= set(source.killlist)
+
+    def test_collections(self):
+        ids = [d['collection_id'] for _, d in
+               xmlpipe.CollectionSource(db='default').documents()]
+        assert ids
+        assert set(ids) <= set(Collection.objects.exclude(uuid='')
+                               .values_list('id', flat=True))
+
+
+class TimingTest(TestCase):
+
+    def setUp(self):
+        timing.reset()
+
+    def test_histogram(self):
+        h = timing.Histogram(buckets=(1, 10, 100))
+        for ms in (0.5, 5, 5, 50, 500):
+            h.add(ms)
+        eq_(h.counts, [1, 2, 1, 1])
+        eq_(h.percentile(50), 10)
+        eq_(h.percentile(99), 500)
+        eq_(h.as_dict()['mean'], 112.1)
+
+    def test_snapshot(self):
+        timing.record('hydrate', 3, 'addons:weight:')
+        timing.record('filters', 1, 'addons:weight:')
+        timing.record('filters', 2, 'addons:weight:')
+        eq_([(h['stage'], h['count']) for h in timing.snapshot()],
+            [('filters', 2), ('hydrate', 1)])
+
+    @mock.patch('search.client.get_pool')
+    @mock.patch('search.client.sphinx.SphinxClient')
+    def test_query_stages(self, sphinx_mock, pool_mock):
+        sphinx_mock.return_value = sphinx_mock
+        sphinx_mock._filters = []
+        sphinx_mock._reqs = []
+        sphinx_mock._limit = 10
+        sphinx_mock._offset = 0
+        sphinx_mock.GetLastError.return_value = ''
+        sphinx_mock.RunQueries.return_value = [
+            {'matches': [], 'total': 0, 'total_found': 0, 'time': '0.250',
+             'error': ''}]
+        pool_mock.return_value = Mock()
+        cache.clear()
+        query('timing', sort='newest', tag='x')
+        stages = dict((h['stage'], h) for h in timing.snapshot())
+        eq_(sorted(stages), ['filters', 'sphinx', 'sphinx.primary'])
+        eq_(stages['sphinx']['shape'], 'addons:newest:inactive,tag')
+        eq_(stages['sphinx.primary']['max'], 250)
+
+
 class BadSortOptionTest(TestCase):
     def test_bad_sort_option(self):
         """Test that we raise an error on bad sort options."""
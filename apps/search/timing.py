@@ -0,0 +1,119 @@
+"""
+In-process latency histograms for each stage of a search.
+
+Every stage (filter extraction, the sphinx round trip, hydration, ...) is
+timed and counted in a histogram keyed on the stage and the query's shape: its
+type, sort and which filters it used.  Histograms live in the process that
+served the searches, so the zadmin pages show one web process at a time.
+"""
+import threading
+import time
+
+import commonware.log
+
+log = commonware.log.getLogger('z.search.timing')
+
+# Upper bounds of the histogram buckets, in milliseconds.  Anything slower
+# than the last one goes in an overflow bucket.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+STAGES = ('filters', 'sphinx', 'sphinx.primary', 'sphinx.meta', 'hydrate',
+          'transforms', 'render')
+
+
+class Histogram(object):
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        for i, bound in enumerate(self.buckets):
+            if ms <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, p):
+        """The upper bound of the bucket holding the p-th percentile."""
+        if not self.count:
+            return 0
+        seen, want = 0, self.count * p / 100.0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= want:
+                return bound
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': zip(list(self.buckets) + ['inf'], self.counts),
+        }
+
+
+_histograms = {}
+_lock = threading.Lock()
+
+
+def record(stage, ms, shape='', client_id=None):
+    log.debug('%s stage=%s shape=%s ms=%.1f' % (client_id, stage, shape, ms))
+    with _lock:
+        key = stage, shape
+        if key not in _histograms:
+            _histograms[key] = Histogram()
+        _histograms[key].add(ms)
+
+
+class timer(object):
+    """
+    Time a block and record it:
+
+        with timer('hydrate', client.shape, client.id):
+            ...
+    """
+
+    def __init__(self, stage, shape='', client_id=None):
+        self.stage, self.shape, self.client_id = stage, shape, client_id
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.ms = (time.time() - self.start) * 1000
+        record(self.stage, self.ms, self.shape, self.client_id)
+
+
+def get_shape(type, sort=None, filters=()):
+    """A short label for the kind of query, e.g. addons:newest:app,tag."""
+    return '%s:%s:%s' % (type, sort or 'weight', ','.join(sorted(filters)))
+
+
+def snapshot():
+    """All histograms as a list of dicts, sorted by stage and shape."""
+    def order(item):
+        stage, shape = item[0]
+        return STAGES.index(stage) if stage in STAGES else 99, shape
+
+    with _lock:
+        return [dict(h.as_dict(), stage=stage, shape=shape)
+                for (stage, shape), h in sorted(_histograms.items(),
+                                                key=order)]
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
@@ -1,14 +1,35 @@
+from datetime import datetime, timedelta
+import os
 import subprocess
+import time
 import zlib
 import re
 
 from django.conf import settings
+from django.core.cache import cache
+
+import commonware.log
 
 import amo
 from versions.compare import version_re
 
+log = commonware.log.getLogger('z.sphinx')
+
 call = lambda x: subprocess.Popen(x, stdout=subprocess.PIPE).communicate()
 
+INDEX_GENERATION_KEY = '%ssphinx:generation' % settings.CACHE_PREFIX
+INDEX_GENERATION_TIMEOUT = 60 * 60 * 24 * 30  # memcached's longest timeout.
+
+# configs/sphinx/sphinx.conf reads MAIN_INDEXED_FILE to find out which add-ons
+# belong in the delta index.
+MAIN_INDEXED_FILE = os.path.join(settings.SPHINX_CATALOG_PATH,
+                                 'addons.indexed')
+DELTA_INDEXED_FILE = os.path.join(settings.SPHINX_CATALOG_PATH,
+                                  'addons_delta.indexed')
+# Rows changed while the indexer is running could be missed, so timestamps
+# are backdated a bit.  Reindexing a few add-ons twice is harmless.
+INDEX_OVERLAP = timedelta(minutes=1)
+
 
 def reindex(rotate=False):
     """
@@ -21,7 +42,10 @@ def reindex(rotate=False):
     if rotate:  # pragma: no cover
         calls.append('--rotate')
 
+    started = indexed_timestamp()
     call(calls)
+    write_timestamp(MAIN_INDEXED_FILE, started)
+    bump_index_generation()
 
 
 def start_sphinx():
@@ -41,6 +65,85 @@ def stop_sphinx():
     call([settings.SPHINX_SEARCHD, '--stop', '--config',
         settings.SPHINX_CONFIG_PATH])
 
+
+def indexed_timestamp():
+    """The time we tell sphinx.conf an index was built, as a SQL datetime."""
+    return (datetime.now() - INDEX_OVERLAP).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def write_timestamp(path, timestamp):
+    with open(path, 'w') as f:
+        f.write(timestamp)
+
+
+def indexer(*args):
+    """Run the sphinx indexer and return True if it worked."""
+    cmd = ([settings.SPHINX_INDEXER, '--config', settings.SPHINX_CONFIG_PATH]
+           + list(args))
+    try:
+        rv = subprocess.call(cmd)
+    except OSError, e:
+        log.error('Could not run %s: %s' % (settings.SPHINX_INDEXER, e))
+        return False
+    if rv != 0:
+        log.error('%s exited with status %s' % (' '.join(cmd), rv))
+    return rv == 0
+
+
+def index_delta():
+    """Reindex the add-ons that changed since the main index was built."""
+    started = indexed_timestamp()
+    if indexer('addons_delta', '--rotate'):
+        write_timestamp(DELTA_INDEXED_FILE, started)
+        bump_index_generation()
+
+
+def merge_delta():
+    """
+    Fold the delta into the main index so the delta stays small, then
+    rebuild the delta from the merge point.
+    """
+    try:
+        delta_indexed = open(DELTA_INDEXED_FILE).read().strip()
+    except IOError:
+        # There's no delta to merge yet.
+        return index_delta()
+
+    # --merge-killlists applies the delta's kill-list to the main index's
+    # documents, so deleted add-ons don't come back once the delta is gone.
+    if indexer('--merge', 'addons', 'addons_delta', '--merge-killlists',
+               '--rotate'):
+        # The main index now has everything the delta had.
+        write_timestamp(MAIN_INDEXED_FILE, delta_indexed)
+        os.remove(DELTA_INDEXED_FILE)
+        index_delta()
+
+
+def index_generation():
+    """
+    A counter that changes every time the indexes are rebuilt.  Cached
+    search data is keyed on it so a reindex invalidates all of it at once.
+    """
+    generation = cache.get(INDEX_GENERATION_KEY)
+    if generation is None:
+        generation = _new_generation()
+    return generation
+
+
+def bump_index_generation():
+    try:
+        return cache.incr(INDEX_GENERATION_KEY)
+    except ValueError:
+        return _new_generation()
+
+
+def _new_generation():
+    # The counter fell out of memcached, so start from a number we can't
+    # have handed out before.
+    generation = int(time.time())
+    cache.add(INDEX_GENERATION_KEY, generation, INDEX_GENERATION_TIMEOUT)
+    return cache.get(INDEX_GENERATION_KEY, generation)
+
 pattern_plus = re.compile(r'((\d+)\+)')
 
 
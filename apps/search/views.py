@@ -12,7 +12,7 @@ from amo.helpers import urlparams
 from amo import urlresolvers
 from addons.models import Category
 from versions.compare import dict_from_int
-from search import forms
+from search import forms, timing
 from search.client import (Client as SearchClient, SearchError,
                            CollectionsClient, PersonasClient)
 from search.forms import SearchForm, SecondarySearchForm
@@ -180,7 +180,8 @@ def _personas(request):
             'categories': categories,
         }
 
-    return jingo.render(request, 'search/personas.html', c)
+    with timing.timer('render', client.shape, client.id):
+        return jingo.render(request, 'search/personas.html', c)
 
 
 def _collections(request):
@@ -211,7 +212,8 @@ def _collections(request):
             'form': form,
         }
 
-    return jingo.render(request, 'search/collections.html', c)
+    with timing.timer('render', client.shape, client.id):
+        return jingo.render(request, 'search/collections.html', c)
 
 
 def search(request):
@@ -304,7 +306,9 @@ def search(request):
 
     pager = amo.utils.paginate(request, results, search_opts['limit'])
 
-    return jingo.render(request, 'search/results.html', {
-                'pager': pager, 'title': title, 'query': query, 'tag': tag,
-                'versions': versions, 'categories': categories, 'tags': tags,
-                'sort_tabs': sort_tabs, 'sort': sort})
+    with timing.timer('render', client.shape, client.id):
+        return jingo.render(request, 'search/results.html', {
+                    'pager': pager, 'title': title, 'query': query,
+                    'tag': tag, 'versions': versions,
+                    'categories': categories, 'tags': tags,
+                    'sort_tabs': sort_tabs, 'sort': sort})
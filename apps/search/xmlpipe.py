@@ -0,0 +1,434 @@
+"""
+Build sphinx documents from the database and stream them as xmlpipe2.
+
+The SQL sources in configs/sphinx/sphinx.conf run one huge joined query that
+holds a connection open for the whole index build.  The sources here walk
+each table in primary key ranges instead, so every query is small and only
+one chunk of documents is in memory at a time.  They emit the same
+documents, fields and attributes as the SQL sources.
+
+    ./manage.py sphinxpipe addons > addons.xml
+"""
+from collections import defaultdict
+from datetime import datetime
+import re
+import time
+from xml.sax.saxutils import escape, quoteattr
+
+from django.db import connections, models
+from django.db.models import Max, Min, Q
+from django.utils.encoding import smart_str
+
+import multidb
+
+import amo
+from addons.models import Addon, AddonCategory, AddonUser, Feature
+from applications.models import Application
+from bandwagon.models import Collection
+from files.models import File
+from tags.models import AddonTag
+from translations.models import Translation
+from versions.models import ApplicationsVersions, Version
+
+from .utils import convert_version, crc32
+
+# Sphinx uses this as max_ver for search engines so they match any version.
+SEARCH_MAX_VER = 9999999999999
+# Personas and search engines aren't tied to an application.
+ANY_APP = 99
+
+# Characters that aren't allowed in an XML document.
+INVALID_XML = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def _qs(model, db):
+    """A plain queryset: no cache-machine and no translation transforms."""
+    return models.query.QuerySet(model, using=db)
+
+
+def _grouped(pairs):
+    rv = defaultdict(list)
+    for key, value in pairs:
+        rv[key].append(value)
+    return rv
+
+
+def timestamp(dt):
+    return int(time.mktime(dt.timetuple())) if dt else 0
+
+
+def pk_ranges(qs, size):
+    """Yield [start, end) primary key ranges that cover everything in qs."""
+    bounds = qs.aggregate(lo=Min('id'), hi=Max('id'))
+    if bounds['lo'] is None:
+        return
+    for start in xrange(bounds['lo'], bounds['hi'] + 1, size):
+        yield start, start + size
+
+
+def translations(ids, db):
+    """Map translation id => [(autoid, locale, string), ...]."""
+    ids = filter(None, ids)
+    if not ids:
+        return {}
+    qs = (_qs(Translation, db).filter(id__in=ids)
+          .values_list('id', 'autoid', 'locale', 'localized_string'))
+    return _grouped((t[0], t[1:]) for t in qs)
+
+
+def by_locale(trans, id):
+    return dict((locale, s) for _, locale, s in trans.get(id, ()))
+
+
+class XmlPipe(object):
+    """Writes an xmlpipe2 docset to ``out``, a file-like object."""
+
+    # Attribute types and the xmlpipe2 declaration for each.
+    types = {
+        'int': 'type="int" bits="32"',
+        'bigint': 'type="bigint"',
+        'bool': 'type="bool"',
+        'float': 'type="float"',
+        'timestamp': 'type="timestamp"',
+        'str2ordinal': 'type="str2ordinal"',
+        'multi': 'type="multi"',
+    }
+
+    def __init__(self, out):
+        self.out = out
+        self.count = 0
+
+    def write(self, s):
+        if isinstance(s, unicode):
+            s = s.encode('utf-8')
+        self.out.write(s)
+
+    def text(self, value):
+        if value is None:
+            return u''
+        if not isinstance(value, unicode):
+            value = str(value).decode('utf-8', 'replace')
+        return escape(INVALID_XML.sub(u'', value))
+
+    def start(self, fields, attrs):
+        self.fields, self.attrs = fields, attrs
+        self.write('<?xml version="1.0" encoding="utf-8"?>\n'
+                   '<sphinx:docset>\n<sphinx:schema>\n')
+        for name in fields:
+            self.write('<sphinx:field name=%s/>\n' % quoteattr(name))
+        for name, type in attrs:
+            self.write('<sphinx:attr name=%s %s/>\n' %
+                       (quoteattr(name), self.types[type]))
+        self.write('</sphinx:schema>\n')
+
+    def document(self, id, doc):
+        parts = [u'<sphinx:document id="%d">' % id]
+        for name in self.fields:
+            parts.append(u'<%s>%s</%s>' % (name, self.text(doc.get(name)),
+                                           name))
+        for name, type in self.attrs:
+            value = doc.get(name)
+            if type == 'multi':
+                value = u' '.join(map(unicode, sorted(set(value or ()))))
+            elif type in ('bool', 'int', 'bigint', 'timestamp'):
+                value = int(value or 0)
+            elif type == 'float':
+                value = float(value or 0)
+            parts.append(u'<%s>%s</%s>' % (name, self.text(value), name))
+        parts.append(u'</sphinx:document>\n')
+        self.write(u''.join(parts))
+        self.count += 1
+
+    def end(self, killlist=()):
+        if killlist:
+            self.write('<sphinx:killlist>\n')
+            for id in killlist:
+                self.write('<id>%d</id>\n' % id)
+            self.write('</sphinx:killlist>\n')
+        self.write('</sphinx:docset>\n')
+
+
+class Source(object):
+    """
+    Subclasses define the schema and ``chunk(start, end)``, which yields
+    ``(document id, {name: value})`` pairs for objects in that pk range.
+    """
+    model = None
+    fields = ()
+    attrs = ()
+
+    def __init__(self, chunk_size=1000, since=None, db=None):
+        self.chunk_size = chunk_size
+        self.since = since
+        self.db = db or multidb.get_slave()
+        self.killlist = []
+
+    def queryset(self):
+        return _qs(self.model, self.db)
+
+    def documents(self):
+        for start, end in pk_ranges(self.queryset(), self.chunk_size):
+            for doc in self.chunk(start, end):
+                yield doc
+
+    def write(self, out):
+        pipe = XmlPipe(out)
+        pipe.start(self.fields, self.attrs)
+        for id, doc in self.documents():
+            pipe.document(id, doc)
+        pipe.end(self.killlist)
+        return pipe.count
+
+
+class AddonSource(Source):
+    """
+    One document for every (name translation, application) of an add-on.
+
+    With ``since``, only add-ons or versions changed after that time, or
+    logged in search_deletions, are included and every document they could
+    have had goes in the kill-list, like the addons_delta SQL source.
+    """
+    model = Addon
+    fields = ('name', 'description', 'developercomments', 'addon_versions',
+              'authors', 'tags')
+    attrs = (('addon_id', 'int'), ('app', 'int'), ('num_files', 'int'),
+             ('num_apps', 'int'), ('name_ord', 'str2ordinal'),
+             ('guid_ord', 'int'), ('type', 'int'), ('addon_status', 'int'),
+             ('weeklydownloads', 'int'), ('totaldownloads', 'int'),
+             ('locale_ord', 'int'), ('max_ver', 'bigint'),
+             ('min_ver', 'bigint'), ('locale', 'str2ordinal'),
+             ('averagerating', 'float'), ('inactive', 'bool'),
+             ('recommended', 'bool'), ('homepage', 'str2ordinal'),
+             ('created', 'timestamp'), ('modified', 'timestamp'),
+             ('category', 'multi'), ('category_featured', 'multi'),
+             ('tag', 'multi'), ('platform', 'multi'))
+
+    def __init__(self, *args, **kw):
+        super(AddonSource, self).__init__(*args, **kw)
+        if self.since:
+            self.deleted = dict(self.deletions())
+            self.app_ids = [0] + list(_qs(Application, self.db)
+                                      .values_list('id', flat=True))
+
+    def deletions(self):
+        """(add-on id, name id) for add-ons that lost rows since ``since``."""
+        cursor = connections[self.db].cursor()
+        cursor.execute('SELECT addon_id, MAX(name_id) FROM search_deletions '
+                       'WHERE created > %s GROUP BY addon_id', [self.since])
+        return cursor.fetchall()
+
+    def queryset(self):
+        qs = _qs(Addon, self.db).exclude(type=amo.ADDON_PERSONA)
+        if self.since:
+            q = (Q(modified__gt=self.since) |
+                 Q(versions__modified__gt=self.since))
+            if self.deleted:
+                q |= Q(id__in=self.deleted)
+            qs = qs.filter(q).distinct()
+        return qs
+
+    def documents(self):
+        for doc in super(AddonSource, self).documents():
+            yield doc
+        if self.since:
+            # Deleted add-ons don't come up in any chunk, so kill their
+            # documents from the name ids that were logged.
+            gone = translations(self.deleted.values(), self.db)
+            self.killlist.extend(autoid * 100 + app
+                                 for trans in gone.values()
+                                 for autoid, _, _ in trans
+                                 for app in self.app_ids)
+
+    def chunk(self, start, end):
+        db = self.db
+        addons = list(self.queryset().filter(id__gte=start, id__lt=end)
+                      .values('id', 'guid', 'type', 'status',
+                              'bayesian_rating', 'weekly_downloads',
+                              'total_downloads', 'inactive', 'default_locale',
+                              'name', 'homepage', 'description', 'summary',
+                              'developer_comments', 'created', 'last_updated'))
+        if not addons:
+            return
+        ids = [a['id'] for a in addons]
+        trans = translations([a[f] for a in addons for f in
+                              ('name', 'homepage', 'description', 'summary',
+                               'developer_comments')], db)
+
+        versions = list(_qs(Version, db).filter(addon__in=ids)
+                        .order_by('id').values_list('id', 'addon', 'version'))
+        version_addon = dict((v, a) for v, a, _ in versions)
+        version_ids = _grouped((a, v) for v, a, _ in versions)
+        version_strings = _grouped((a, s) for _, a, s in versions)
+
+        # addon => app => [(version, min, max), ...]
+        apps = defaultdict(lambda: defaultdict(list))
+        for v, app, lo, hi in (_qs(ApplicationsVersions, db)
+                               .filter(version__in=version_addon)
+                               .values_list('version', 'application',
+                                            'min__version', 'max__version')):
+            apps[version_addon[v]][app].append((v, lo, hi))
+
+        files = list(_qs(File, db).filter(version__in=version_addon)
+                     .values_list('version', 'platform', 'status'))
+        platforms = _grouped((v, p or amo.PLATFORM_ALL.id)
+                             for v, p, _ in files)
+        num_files = defaultdict(int)
+        for v, _, status in files:
+            if status > 0:
+                num_files[version_addon[v]] += 1
+
+        authors = _grouped(_qs(AddonUser, db)
+                           .filter(addon__in=ids, listed=True)
+                           .values_list('addon', 'user__nickname'))
+        tags = _grouped((t[0], t[1:]) for t in
+                        _qs(AddonTag, db).filter(addon__in=ids)
+                        .values_list('addon', 'tag', 'tag__tag_text'))
+        cats = _grouped((c[0], c[1:]) for c in
+                        _qs(AddonCategory, db).filter(addon__in=ids)
+                        .values_list('addon', 'category', 'feature'))
+        now = datetime.now()
+        features = _grouped((f[0], f[1:]) for f in
+                            _qs(Feature, db).filter(addon__in=ids,
+                                                    start__lte=now,
+                                                    end__gt=now)
+                            .values_list('addon', 'locale', 'application'))
+
+        for addon in addons:
+            id = addon['id']
+            vs = version_ids[id]
+            common = {
+                'addon_id': id,
+                'type': addon['type'],
+                'addon_status': addon['status'],
+                'guid_ord': crc32(smart_str(addon['guid'] or '')),
+                'averagerating': addon['bayesian_rating'],
+                'weeklydownloads': addon['weekly_downloads'],
+                'totaldownloads': addon['total_downloads'],
+                'inactive': addon['inactive'],
+                'created': timestamp(addon['created']),
+                'modified': timestamp(addon['last_updated']),
+                'num_files': (1 if addon['status'] == amo.STATUS_LISTED
+                              else sum(num_files[v] for v in vs)),
+                'num_apps': len(apps[id]),
+                'addon_versions': u','.join(version_strings[id]),
+                'authors': u','.join(authors[id]),
+                'tags': u','.join(text for _, text in tags[id]),
+                'tag': [tag for tag, _ in tags[id]],
+                'category': [c for c, _ in cats[id]],
+                'category_featured': [c for c, featured in cats[id]
+                                      if featured],
+            }
+            strings = dict((f, by_locale(trans, addon[f])) for f in
+                           ('homepage', 'description', 'summary',
+                            'developer_comments'))
+            # Add-ons without any application compatibility still get
+            # documents, with app 0.
+            app_versions = apps[id].items() or [(0, [(v, None, None)
+                                                     for v in vs])]
+            for autoid, locale, name in trans.get(addon['name'], ()):
+                if self.since:
+                    self.killlist.extend(autoid * 100 + app
+                                         for app in self.app_ids)
+                if name is None or not (strings['description'].get(locale) or
+                                        strings['summary'].get(locale) or
+                                        addon['default_locale'] == locale):
+                    continue
+                name = name.lstrip()
+                for app, avs in app_versions:
+                    doc = dict(common)
+                    doc.update(self.app_attrs(addon, app, avs, platforms))
+                    doc.update({
+                        'name': name,
+                        'name_ord': name.upper(),
+                        'locale': locale,
+                        'locale_ord': crc32(smart_str(locale or '')),
+                        'homepage': strings['homepage'].get(locale),
+                        'description': strings['description'].get(locale),
+                        'developercomments':
+                            strings['developer_comments'].get(locale),
+                        'recommended': any(
+                            f_app == doc['app'] and f_locale in (None, locale)
+                            for f_locale, f_app in features[id]),
+                    })
+                    yield autoid * 100 + app, doc
+
+    def app_attrs(self, addon, app, avs, platforms):
+        search = addon['type'] == amo.ADDON_SEARCH
+        if search or addon['type'] == amo.ADDON_PERSONA:
+            doc_app = ANY_APP
+        else:
+            doc_app = app
+        mins = [convert_version(lo) for _, lo, _ in avs if lo]
+        maxes = [convert_version(hi) for _, _, hi in avs if hi]
+        return {
+            'app': doc_app,
+            'min_ver': 0 if search else min(mins or [0]),
+            'max_ver': SEARCH_MAX_VER if search else max(maxes or [0]),
+            'platform': [p for v, _, _ in avs
+                         for p in platforms.get(v) or [amo.PLATFORM_ALL.id]],
+        }
+
+
+class PersonaSource(Source):
+    """One document for every name translation of a persona."""
+    model = Addon
+    fields = ('name', 'description')
+    attrs = (('addon_id', 'int'), ('locale_ord', 'int'),
+             ('locale', 'str2ordinal'), ('created', 'timestamp'))
+
+    def queryset(self):
+        return _qs(Addon, self.db).filter(type=amo.ADDON_PERSONA)
+
+    def chunk(self, start, end):
+        rows = list(self.queryset().filter(id__gte=start, id__lt=end)
+                    .values_list('id', 'name', 'description', 'created'))
+        trans = translations([r[1] for r in rows] + [r[2] for r in rows],
+                             self.db)
+        for id, name_id, description_id, created in rows:
+            description = by_locale(trans, description_id)
+            for autoid, locale, name in trans.get(name_id, ()):
+                yield autoid, {
+                    'addon_id': id,
+                    'name': name,
+                    'description': description.get(locale),
+                    'locale': locale,
+                    'locale_ord': crc32(smart_str(locale or '')),
+                    'created': timestamp(created),
+                }
+
+
+class CollectionSource(Source):
+    """One document for every name translation of a collection."""
+    model = Collection
+    fields = ('name', 'description')
+    attrs = (('collection_id', 'int'), ('locale_ord', 'int'),
+             ('locale', 'str2ordinal'), ('weekly_subscribers', 'int'),
+             ('monthly_subscribers', 'int'), ('subscribers', 'int'),
+             ('rating', 'float'), ('created', 'timestamp'))
+
+    def queryset(self):
+        return _qs(Collection, self.db).exclude(uuid='')
+
+    def chunk(self, start, end):
+        rows = list(self.queryset().filter(id__gte=start, id__lt=end)
+                    .values('id', 'name', 'description', 'weekly_subscribers',
+                            'monthly_subscribers', 'subscribers', 'rating',
+                            'created'))
+        trans = translations([r['name'] for r in rows] +
+                             [r['description'] for r in rows], self.db)
+        for row in rows:
+            description = by_locale(trans, row['description'])
+            for autoid, locale, name in trans.get(row['name'], ()):
+                doc = dict(row, collection_id=row['id'], name=name,
+                           description=description.get(locale),
+                           locale=locale,
+                           locale_ord=crc32(smart_str(locale or '')),
+                           created=timestamp(row['created']))
+                yield autoid, doc
+
+
+sources = {
+    'addons': AddonSource,
+    'personas': PersonaSource,
+    'collections': CollectionSource,
+}
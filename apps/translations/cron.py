@@ -0,0 +1,42 @@
+from django.db import models
+
+import commonware.log
+from celery.messaging import establish_connection
+
+from amo.utils import chunked
+import cronjobs
+
+from .fields import PurifiedField
+from .models import Translation
+from .tasks import bleach_strings
+
+log = commonware.log.getLogger('z.cron')
+
+
+def purified_fields():
+    """(model, field) for every purified or linkified field."""
+    for model in models.get_models():
+        for field in getattr(model._meta, 'translated_fields', []):
+            if isinstance(field, PurifiedField):
+                yield model, field
+
+
+@cronjobs.register
+def bleach_translations():
+    """
+    Store the bleached HTML for purified and linkified strings saved before
+    it was computed at write time.
+    """
+    with establish_connection() as conn:
+        for model, field in purified_fields():
+            ids = model._default_manager.values(field.attname)
+            autoids = list(Translation.objects.no_cache()
+                           .filter(id__in=ids,
+                                   localized_string__isnull=False,
+                                   localized_string_clean__isnull=True)
+                           .values_list('autoid', flat=True))
+            log.info('Bleaching %s %s.%s strings.' %
+                     (len(autoids), model.__name__, field.name))
+            for chunk in chunked(autoids, 500):
+                bleach_strings.apply_async(args=[chunk, field.rel.to],
+                                           connection=conn)
@@ -1,3 +1,5 @@
+import threading
+
 from django import forms
 from django.conf import settings
 from django.db import models
@@ -5,7 +7,8 @@ from django.db.models.fields import related
 from django.utils import translation as translation_utils
 from django.utils.translation.trans_real import to_language
 
-from .models import Translation, PurifiedTranslation, LinkifiedTranslation
+from .models import (Translation, PurifiedTranslation, LinkifiedTranslation,
+                     reserve_ids)
 from .widgets import TranslationWidget
 
 
@@ -94,7 +97,14 @@ class TranslationDescriptor(related.ReverseSingleRelatedObjectDescriptor):
         try:
             return getattr(instance, self.field.get_cache_name())
         except AttributeError:
-            return None
+            pass
+
+        # The transform may have deferred this field to save joins; load it
+        # (and the other deferred fields) for the whole batch now.
+        deferred = instance.__dict__.get('_deferred_translations')
+        if deferred and self.field.name in deferred.names:
+            deferred.load()
+            return getattr(instance, self.field.get_cache_name(), None)
 
     def __set__(self, instance, value):
         lang = translation_utils.get_language()
@@ -139,30 +149,43 @@ class TranslationDescriptor(related.ReverseSingleRelatedObjectDescriptor):
         """
         Create Translations from a {'locale': 'string'} mapping.
 
-        If one of the locales matches lang, that Translation will be returned.
+        All the locales are written with one Translation.new_many.  If one
+        of them matches lang, that Translation will be returned.
         """
-        rv = None
-        for locale, string in dict_.items():
-            # The Translation is created and saved in here.
-            trans = self.translation_from_string(instance, locale, string)
+        if not dict_:
+            return None
+
+        trans_id = getattr(instance, self.field.attname)
+        if trans_id is None:
+            trans_id = reserve_ids(1)[0]
+        saved = self.model.new_many([(trans_id, locale, string)
+                                     for locale, string in dict_.items()])
 
-            # Set the Translation on the object because translation_from_string
-            # doesn't expect Translations to be created but not attached.
+        rv = None
+        for trans in saved:
+            # Set the Translation on the object so callers see the id even
+            # if none of the locales is the current one.
             self.__set__(instance, trans)
 
             # If we're setting the current locale, set it to the object so
             # callers see the expected effect.
-            if to_language(locale) == lang:
+            if to_language(trans.locale) == lang:
                 rv = trans
         return rv
 
 
 class TranslatedFieldMixin(object):
-    """Mixin that fetches all ``TranslatedFields`` after instantiation."""
+    """
+    Mixin that fetches all ``TranslatedFields`` after instantiation.
+
+    Objects loaded by a queryset get theirs from the ``attach_translations``
+    transform in one query for the whole batch instead.
+    """
 
     def __init__(self, *args, **kw):
         super(TranslatedFieldMixin, self).__init__(*args, **kw)
-        self._set_translated_fields()
+        if self.__class__ not in getattr(_batching, 'models', ()):
+            self._set_translated_fields()
 
     def _set_translated_fields(self):
         """Fetch and attach all of this object's translations."""
@@ -197,6 +220,59 @@ class TranslatedFieldMixin(object):
         return translations_with_fallback(ids, lang, settings.LANGUAGE_CODE)
 
 
+_batching = threading.local()
+
+
+class batching(object):
+    """
+    Skip the per-instance fetches for ``model`` in this block; the objects
+    created here will go through ``attach_translations``.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def __enter__(self):
+        if not hasattr(_batching, 'models'):
+            _batching.models = set()
+        self.added = self.model not in _batching.models
+        _batching.models.add(self.model)
+
+    def __exit__(self, *exc_info):
+        if self.added:
+            _batching.models.discard(self.model)
+
+
+def attach_translations(objs):
+    """
+    Queryset transform for TranslatedFieldMixin models: fetch the
+    translations for all of ``objs`` with a single ``fetch_translations``.
+
+    That's called on the first object with the ids of the whole batch, so the
+    model's fallback rules must not depend on the instance.
+    """
+    if not objs:
+        return
+
+    fields = objs[0]._meta.translated_fields
+    ids = set(getattr(obj, f.attname) for obj in objs for f in fields)
+    ids.discard(None)
+    if not ids:
+        return
+
+    lang = translation_utils.get_language()
+    translations = objs[0].fetch_translations(list(ids), lang)
+    found = dict((t.id, t) for t in translations)
+    for obj in objs:
+        for field in fields:
+            trans = found.get(getattr(obj, field.attname))
+            if trans is not None:
+                setattr(obj, field.name, trans)
+
+# Querysets check this to know to skip the fetches in TranslatedFieldMixin.
+attach_translations.batching = True
+
+
 def translations_with_fallback(ids, lang, default):
     """Default implementation for TranslatedFieldMixin.fetch_translations."""
     if not ids:
@@ -1,4 +1,10 @@
-from django.db import models, connection
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, connection, transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils.translation.trans_real import to_language
 import jinja2
 
 from bleach import Bleach
@@ -78,19 +84,7 @@ class Translation(caching.base.CachingMixin, models.Model):
         an existing translation.
         """
         if id is None:
-            # Get a sequence key for the new translation.
-            cursor = connection.cursor()
-            cursor.execute("""UPDATE translations_seq
-                              SET id=LAST_INSERT_ID(id + 1)""")
-
-            # The sequence table should never be empty. But alas, if it is,
-            # let's fix it.
-            if not cursor.rowcount > 0:
-                cursor.execute("""INSERT INTO translations_seq (id)
-                                  VALUES(LAST_INSERT_ID(id + 1))""")
-
-            cursor.execute('SELECT LAST_INSERT_ID() FROM translations_seq')
-            id = cursor.fetchone()[0]
+            id = reserve_ids(1)[0]
 
         # Update if one exists, otherwise create a new one.
         q = {'id': id, 'locale': locale}
@@ -103,15 +97,128 @@ class Translation(caching.base.CachingMixin, models.Model):
 
         return trans
 
+    @classmethod
+    def new_many(cls, strings):
+        """
+        Create or update many translations in one INSERT.
+
+        ``strings`` is a list of ``(id, locale, string)``.  Get ids for new
+        translations from ``reserve_ids``, which hands out a whole block in
+        one statement.  Locales are normalized and repeats of an ``(id,
+        locale)`` keep the last string.  Returns the saved translations in
+        the order they were first given.
+
+        This skips save() and the signals, so it does the cleaning, the
+        sort keys and the cache invalidation itself.
+        """
+        if not strings:
+            return []
+
+        # (id, locale) => (id, locale, string), matched like the unique key.
+        unique, order = {}, []
+        for id, locale, string in strings:
+            locale = settings.LANGUAGE_URL_MAP.get(to_language(locale),
+                                                   locale)
+            key = id, locale.lower()
+            if key not in unique:
+                order.append(key)
+            unique[key] = id, locale, string
+
+        now = datetime.now()
+        rows, params = [], []
+        for key in order:
+            id, locale, string = unique[key]
+            trans = cls(id=id, locale=locale, localized_string=string)
+            trans.clean()
+            rows.append('(%s, %s, %s, %s, %s, %s)')
+            params.extend([id, locale, trans.localized_string,
+                           trans.localized_string_clean, now, now])
+
+        cursor = connection.cursor()
+        cursor.execute("""
+            INSERT INTO translations
+                (id, locale, localized_string, localized_string_clean,
+                 created, modified)
+            VALUES %s
+            ON DUPLICATE KEY UPDATE
+                localized_string=VALUES(localized_string),
+                localized_string_clean=VALUES(localized_string_clean),
+                modified=VALUES(modified)""" % ','.join(rows), params)
+        transaction.commit_unless_managed()
+
+        ids = set(id for id, _ in order)
+        saved = list(cls.objects.no_cache().filter(id__in=ids))
+        cls.objects.invalidate(*saved)
+        cache.delete_many([locale_cache_key(t.id, t.locale) for t in saved])
+        update_sort_keys(saved)
+
+        found = dict(((t.id, t.locale.lower()), t) for t in saved)
+        return [found[key] for key in order if key in found]
+
+
+def reserve_ids(count):
+    """
+    Take ``count`` consecutive ids from ``translations_seq`` in one
+    statement.
+    """
+    cursor = connection.cursor()
+    cursor.execute("""UPDATE translations_seq
+                      SET id=LAST_INSERT_ID(id + %s)""", [count])
+
+    # The sequence table should never be empty. But alas, if it is,
+    # let's fix it.
+    if not cursor.rowcount > 0:
+        cursor.execute("""INSERT INTO translations_seq (id)
+                          VALUES(LAST_INSERT_ID(%s))""", [count])
+
+    cursor.execute('SELECT LAST_INSERT_ID() FROM translations_seq')
+    last = cursor.fetchone()[0]
+    return range(last - count + 1, last + 1)
+
+
+def locale_cache_key(id, locale):
+    """The key for one translation string in the get_trans cache."""
+    return '%strans:%s:%s' % (settings.CACHE_PREFIX, id,
+                              (locale or '').lower())
+
+
+def clear_locale_cache(id):
+    """Drop every cached locale of translation ``id``."""
+    cache.delete_many([locale_cache_key(id, locale)
+                       for locale in settings.AMO_LANGUAGES])
+
+
+def invalidate_locale_cache(sender, instance, raw=False, **kw):
+    if isinstance(instance, Translation):
+        if raw:
+            # Fixtures reuse ids with different sets of locales.
+            clear_locale_cache(instance.id)
+        else:
+            cache.delete(locale_cache_key(instance.id, instance.locale))
+
+# Not limited to one sender so the proxy models are covered too.  Fixtures
+# are saved raw, skipping Translation.save, but they still send post_save.
+post_save.connect(invalidate_locale_cache,
+                  dispatch_uid='translations.locale_cache.save')
+post_delete.connect(invalidate_locale_cache,
+                    dispatch_uid='translations.locale_cache.delete')
+
 
 class PurifiedTranslation(Translation):
-    """Run the string through bleach to get a safe, linkified version."""
+    """
+    Run the string through bleach to get a safe, linkified version.
+
+    That happens in ``clean`` when the string is saved, so the bleached HTML
+    is stored in ``localized_string_clean``.  Rows that haven't been
+    backfilled yet are bleached when they're read.
+    """
 
     class Meta:
         proxy = True
 
     def __unicode__(self):
-        if not self.localized_string_clean:
+        if self.localized_string_clean is None:
+            # Not backfilled yet (see translations.cron.bleach_translations).
             self.clean()
         return unicode(self.localized_string_clean)
 
@@ -147,3 +254,63 @@ class TranslationSequence(models.Model):
 
     class Meta:
         db_table = 'translations_seq'
+
+
+class TranslationSortKey(models.Model):
+    """
+    A short copy of each translation that order_by_translation can sort on
+    instead of the TEXT column.  Kept in sync by Translation saves.
+
+    The locale fallback is picked in the query, so the sort is still a
+    filesort; it's just over short VARCHARs that fit in memory.
+    """
+    autoid = models.IntegerField(primary_key=True)
+    id = models.IntegerField()
+    locale = models.CharField(max_length=10)
+    sort_key = models.CharField(max_length=255, default='')
+
+    class Meta:
+        db_table = 'translations_sort'
+        unique_together = ('id', 'locale')
+
+
+def sort_key(string):
+    # Same as LEFT(TRIM(localized_string), 255) in migration 40.
+    return string.strip(' ')[:255]
+
+
+def update_sort_key(sender, instance, **kw):
+    if isinstance(instance, Translation):
+        update_sort_keys([instance])
+
+
+def update_sort_keys(translations):
+    """Write the sort keys of ``translations`` with one upsert."""
+    rows, params, empty = [], [], []
+    for t in translations:
+        if t.localized_string is None:
+            empty.append(t.autoid)
+        else:
+            rows.append('(%s, %s, %s, %s)')
+            params.extend([t.autoid, t.id, t.locale,
+                           sort_key(t.localized_string)])
+    if empty:
+        TranslationSortKey.objects.filter(autoid__in=empty).delete()
+    if rows:
+        cursor = connection.cursor()
+        cursor.execute("""INSERT INTO translations_sort
+                              (autoid, id, locale, sort_key)
+                          VALUES %s
+                          ON DUPLICATE KEY UPDATE
+                              sort_key=VALUES(sort_key)""" % ','.join(rows),
+                       params)
+        transaction.commit_unless_managed()
+
+
+def delete_sort_key(sender, instance, **kw):
+    if isinstance(instance, Translation):
+        TranslationSortKey.objects.filter(autoid=instance.autoid).delete()
+
+post_save.connect(update_sort_key, dispatch_uid='translations.sort_key.save')
+post_delete.connect(delete_sort_key,
+                    dispatch_uid='translations.sort_key.delete')
@@ -6,6 +6,8 @@ from django.db.models.sql import compiler
 
 from django.utils import translation as translation_utils
 
+from translations.models import TranslationSortKey
+
 
 def order_by_translation(qs, fieldname):
     """
@@ -14,6 +16,9 @@ def order_by_translation(qs, fieldname):
 
     The model being sorted needs a get_fallback() classmethod that describes
     the fallback locale.  get_fallback() can return a string or a Field.
+
+    The sort uses the short keys in translations_sort rather than the TEXT
+    strings in translations, so MySQL can sort in memory.
     """
     if fieldname.startswith('-'):
         desc = True
@@ -26,7 +31,7 @@ def order_by_translation(qs, fieldname):
     field = model._meta.get_field(fieldname)
 
     # (lhs, rhs, lhs_col, rhs_col) => lhs.lhs_col = rhs.rhs_col
-    connection = (model._meta.db_table, field.rel.to._meta.db_table,
+    connection = (model._meta.db_table, TranslationSortKey._meta.db_table,
                   field.column, field.rel.field_name)
 
     # Doing the manual joins is flying under Django's radar, so we need to make
@@ -34,7 +39,7 @@ def order_by_translation(qs, fieldname):
     if not qs.query.tables:
         qs.query.get_initial_alias()
 
-    # Force two LEFT JOINs against the translation table.  We'll hook up the
+    # Force two LEFT JOINs against the sort key table.  We'll hook up the
     # language fallbacks later.
     qs.query = qs.query.clone(TranslationQuery)
     t1 = qs.query.join(connection, always_create=True, promote=True)
@@ -42,7 +47,7 @@ def order_by_translation(qs, fieldname):
     qs.query.translation_aliases = {field: (t1, t2)}
 
     name = 'translated_%s' % field.column
-    ifnull = 'IFNULL(%s.`localized_string`, %s.`localized_string`)' % (t1, t2)
+    ifnull = 'IFNULL(%s.`sort_key`, %s.`sort_key`)' % (t1, t2)
     prefix = '-' if desc else ''
     return qs.extra(select={name: ifnull}, order_by=[prefix + name])
 
@@ -0,0 +1,41 @@
+from django.core.cache import cache
+from django.db import connection, transaction
+
+import commonware.log
+from celery.decorators import task
+
+from .models import Translation, locale_cache_key
+
+task_log = commonware.log.getLogger('z.task')
+
+
+@task
+def bleach_strings(autoids, model, **kw):
+    """
+    Store the bleached HTML for the ``model`` strings in ``autoids`` with one
+    UPDATE.
+    """
+    task_log.debug('Bleaching %s %s strings.' % (len(autoids),
+                                                 model.__name__))
+    strings = list(model.objects.no_cache()
+                   .filter(autoid__in=autoids, localized_string__isnull=False))
+    if not strings:
+        return
+
+    cases, params = [], []
+    for trans in strings:
+        trans.clean()
+        cases.append('WHEN %s THEN %s')
+        params.extend([trans.autoid, trans.localized_string_clean])
+    ids = [trans.autoid for trans in strings]
+    cursor = connection.cursor()
+    cursor.execute("""UPDATE translations
+                      SET localized_string_clean = CASE autoid %s END
+                      WHERE autoid IN (%s)""" %
+                   (' '.join(cases), ','.join(['%s'] * len(ids))),
+                   params + ids)
+    transaction.commit_unless_managed()
+
+    # All our updates were sql, so invalidate manually.
+    Translation.objects.invalidate(*strings)
+    cache.delete_many([locale_cache_key(t.id, t.locale) for t in strings])
@@ -1,17 +1,20 @@
 # -*- coding: utf-8 -*-
 from django.conf import settings
 from django import test
+from django.db import connections
 from django.utils import translation
 from django.utils.functional import lazy
 
 import jinja2
+import mock
 from nose.tools import eq_
 from test_utils import ExtraAppTestCase, trans_eq
 
 from testapp.models import TranslatedModel, UntranslatedModel, FancyModel
 from translations.models import (Translation, PurifiedTranslation,
-                                 TranslationSequence)
-from translations import widgets
+                                 TranslationSequence, TranslationSortKey,
+                                 reserve_ids, sort_key)
+from translations import cron, tasks, transformer, widgets
 from translations.query import order_by_translation
 
 
@@ -59,6 +62,35 @@ class TranslationSequenceTestCase(test.TestCase):
         assert newtrans2.pk > newtrans1.pk, (
             'Translation sequence needs to keep increasing.')
 
+    def test_reserve_ids(self):
+        first = reserve_ids(3)
+        eq_(first, range(first[0], first[0] + 3))
+        assert reserve_ids(1)[0] > first[-1]
+
+    def test_new_many(self):
+        id, = reserve_ids(1)
+        saved = Translation.new_many([(id, 'en-US', ' one '),
+                                      (id, 'de', 'eins')])
+        eq_([(t.id, t.locale, t.localized_string) for t in saved],
+            [(id, 'en-US', 'one'), (id, 'de', 'eins')])
+
+        # Existing strings are updated in place.
+        autoid = saved[0].autoid
+        saved = Translation.new_many([(id, 'en-US', 'uno')])
+        eq_(saved[0].autoid, autoid)
+        eq_(saved[0].localized_string, 'uno')
+        eq_(Translation.objects.filter(id=id).count(), 2)
+        eq_(TranslationSortKey.objects.get(id=id, locale='en-US').sort_key,
+            'uno')
+
+    def test_new_many_normalizes_locales(self):
+        id, = reserve_ids(1)
+        saved = Translation.new_many([(id, 'en-us', 'one'), (id, 'de', 'x'),
+                                      (id, 'EN-US', 'uno')])
+        eq_([(t.locale, t.localized_string) for t in saved],
+            [('en-US', 'uno'), ('de', 'x')])
+        eq_(Translation.objects.filter(id=id).count(), 2)
+
 
 class TranslationTestCase(ExtraAppTestCase):
     fixtures = ['testapp/test_models.json']
@@ -153,6 +185,89 @@ class TranslationTestCase(ExtraAppTestCase):
         # Make sure it was an update, not an insert.
         eq_(o.name.autoid, translation_id)
 
+    def test_fetch_from_cache(self):
+        get_model = lambda: TranslatedModel.objects.no_cache().get(id=1)
+        get_model()  # Fills the cache.
+        with mock.patch('translations.transformer.get_trans_from_db') as db:
+            o = get_model()
+            assert not db.called
+        trans_eq(o.name, 'some name', 'en-US')
+        trans_eq(o.description, 'some description', 'en-US')
+
+    def test_fallback_from_cache(self):
+        get_model = lambda: TranslatedModel.objects.no_cache().get(id=1)
+        translation.activate('de')
+        try:
+            get_model()
+            fetch = 'translations.transformer.get_trans_from_db'
+            with mock.patch(fetch) as db:
+                o = get_model()
+                assert not db.called
+            trans_eq(o.name, 'German!! (unst unst)', 'de')
+            trans_eq(o.description, 'some description', 'en-US')
+        finally:
+            translation.deactivate()
+
+    def test_cache_invalidated_on_save(self):
+        get_model = lambda: TranslatedModel.objects.no_cache().get(id=1)
+        o = get_model()
+        o.name = 'new name'
+        o.save()
+        trans_eq(get_model().name, 'new name', 'en-US')
+
+        # A new locale replaces the cached fallback.
+        translation.activate('de')
+        try:
+            trans_eq(get_model().description, 'some description', 'en-US')
+            Translation.new(u'Beschreibung', 'de', id=o.description_id)
+            trans_eq(get_model().description, u'Beschreibung', 'de')
+        finally:
+            translation.deactivate()
+
+    def test_only_translations(self):
+        qs = TranslatedModel.objects.no_cache().only_translations('name')
+        first, second = qs.order_by('id')[:2]
+        assert not hasattr(first, '_description_cache')
+        trans_eq(first.name, 'some name', 'en-US')
+
+        # Touching a deferred field loads it for the whole batch.
+        trans_eq(first.description, 'some description', 'en-US')
+        assert not hasattr(second, '_deferred_translations')
+        eq_(second.description, None)
+
+    def test_only_translations_set_deferred(self):
+        o = (TranslatedModel.objects.no_cache().only_translations('name')
+             .get(id=1))
+        o.description = 'new description'
+        o.save()
+        o = TranslatedModel.objects.no_cache().get(id=1)
+        trans_eq(o.description, 'new description', 'en-US')
+
+    def test_query_built_once(self):
+        connection = connections['default']
+        fields = TranslatedModel._meta.translated_fields
+        sql, layout = transformer.build_query(TranslatedModel, connection)
+        assert transformer.build_query(TranslatedModel, connection,
+                                       fields)[0] is sql
+        eq_(layout, ('lang', 'fallback'))
+        assert sql.endswith('IN (')
+
+    def test_fetch_in_chunks(self):
+        chunk_size = transformer.CHUNK_SIZE
+        transformer.CHUNK_SIZE = 1
+        try:
+            objs = list(TranslatedModel.objects.no_cache().order_by('id')
+                        .no_transforms())
+            locales = lambda item: ('en-US', settings.LANGUAGE_CODE)
+            # Straight to the database, skipping the string cache.
+            transformer.get_trans_from_db(
+                TranslatedModel, objs, locales,
+                TranslatedModel._meta.translated_fields)
+            trans_eq(objs[0].name, 'some name', 'en-US')
+            trans_eq(objs[1].name, 'speak American', 'en-US')
+        finally:
+            transformer.CHUNK_SIZE = chunk_size
+
     def test_create_with_dict(self):
         # Set translations with a dict.
         strings = {'en-US': 'right language', 'de': 'wrong language'}
@@ -227,6 +342,23 @@ class TranslationTestCase(ExtraAppTestCase):
         eq_(ids(order_by_translation(q, 'name')), expected)
         eq_(ids(order_by_translation(q, '-name')), list(reversed(expected)))
 
+    def test_sort_keys_follow_saves(self):
+        q = TranslatedModel.objects.all()
+        o = TranslatedModel.objects.get(id=4)
+        o.name = 'zzz last'
+        o.save()
+        eq_(TranslationSortKey.objects.get(id=o.name_id,
+                                           locale='en-US').sort_key,
+            'zzz last')
+        eq_(ids(order_by_translation(q, 'name')), [1, 3, 4])
+
+        Translation.objects.filter(id=o.name_id).delete()
+        eq_(TranslationSortKey.objects.filter(id=o.name_id).count(), 0)
+
+    def test_sort_key_matches_backfill(self):
+        # Migration 40 used TRIM(), which only strips spaces.
+        eq_(sort_key(u'  \txyz \n '), u'\txyz \n')
+
     def test_sorting_by_field(self):
         field = TranslatedModel._meta.get_field('default_locale')
         TranslatedModel.get_fallback = classmethod(lambda cls: field)
@@ -302,6 +434,31 @@ class TranslationTestCase(ExtraAppTestCase):
         eq_(s, u'%s==%s' % (m.purified.localized_string_clean,
                             m.linkified.localized_string_clean))
 
+    def test_bleach_translations(self):
+        Translation.objects.filter(id=20).update(localized_string_clean=None)
+        tasks.bleach_strings([20], PurifiedTranslation)
+        m = FancyModel.objects.no_cache().get(id=1)
+        eq_(u'%s' % m.purified,
+            '<i>x</i> '
+            '<a href="http://yyy.com" rel="nofollow">http://yyy.com</a>')
+
+    def test_bleach_skips_null_strings(self):
+        t = Translation.objects.filter(id=20)
+        t.update(localized_string_clean=None)
+        eq_(self._bleached(), set(t.values_list('autoid', flat=True)))
+
+        # Nothing to bleach, so don't pick it up every time.
+        t.update(localized_string=None)
+        eq_(self._bleached(), set())
+
+    def _bleached(self):
+        with mock.patch('translations.cron.establish_connection'):
+            with mock.patch('translations.cron.bleach_strings') as task:
+                cron.bleach_translations()
+                return set(autoid for args, kw in
+                           task.apply_async.call_args_list
+                           for autoid in kw['args'][0])
+
     def test_outgoing_url(self):
         """
         Make sure linkified field is properly bounced off our outgoing URL
@@ -346,10 +503,18 @@ def test_purified_translation_html():
     """__html__() should return a string."""
     s = u'<b>heyhey</b>'
     x = PurifiedTranslation(localized_string=s)
+    x.clean()
     assert isinstance(x.__html__(), unicode)
     eq_(x.__html__(), s)
 
 
+def test_purified_translation_not_cleaned():
+    """Strings without stored clean HTML are bleached when read."""
+    x = PurifiedTranslation(localized_string=u'<b>heyhey</b>')
+    eq_(unicode(x), u'<b>heyhey</b>')
+    eq_(x.localized_string_clean, u'<b>heyhey</b>')
+
+
 def test_comparison_with_lazy():
     x = Translation(localized_string='xxx')
     lazy_u = lazy(lambda x: x, unicode)
@@ -1,10 +1,11 @@
 from django.conf import settings
+from django.core.cache import cache
 from django.db import connections, models
 from django.utils import translation
 
 import multidb
 
-from translations.models import Translation
+from translations.models import Translation, locale_cache_key
 
 isnull = """IF(!ISNULL({t1}.localized_string), {t1}.{col}, {t2}.{col})
             AS {name}_{col}"""
@@ -13,28 +14,58 @@ join = """LEFT OUTER JOIN translations {t}
 
 trans_fields = [f.name for f in Translation._meta.fields]
 
+# Cached for a (translation id, locale) that has no string, so we know to
+# use the fallback locale without asking the database.
+MISSING = ()
 
-def build_query(model, connection):
-    qn = connection.ops.quote_name
-    selects, joins, params = [], [], []
 
-    # The model can define a fallback locale (which may be a Field).
+def get_fallback(model):
+    """The model can define a fallback locale (which may be a Field)."""
     if hasattr(model, 'get_fallback'):
-        fallback = model.get_fallback()
+        return model.get_fallback()
     else:
-        fallback = settings.LANGUAGE_CODE
+        return settings.LANGUAGE_CODE
 
-    # Add the selects and joins for each translated field on the model.
-    for field in model._meta.translated_fields:
-        # Add the primary and (possibly) fallback locale parameters.
-        params.append(translation.get_language())
-        if isinstance(fallback, models.Field):
-            fallback_str = '%s.%s' % (qn(model._meta.db_table),
-                                      qn(fallback.column))
-        else:
-            fallback_str = '%s'
-            params.append(fallback)
 
+# The ids for one query are sent as parameters, at most this many at a time.
+CHUNK_SIZE = 500
+
+# (model, database engine, field names) => (sql, locale parameters per field)
+_queries = {}
+
+
+def build_query(model, connection, fields=None):
+    """
+    The SQL to select ``fields`` for a model, ending in an open ``IN (`` for
+    the id placeholders, and which locales to pass as parameters for each
+    field.  It only depends on the model, the database and the fields, so
+    it's built once and reused.
+    """
+    if fields is None:
+        fields = model._meta.translated_fields
+    key = (model, connection.settings_dict['ENGINE'],
+           tuple(f.name for f in fields))
+    if key not in _queries:
+        _queries[key] = _build_query(model, connection, fields)
+    return _queries[key]
+
+
+def _build_query(model, connection, fields):
+    qn = connection.ops.quote_name
+    selects, joins = [], []
+
+    # The fallback locale is a parameter unless it comes from a column.
+    fallback = get_fallback(model)
+    if isinstance(fallback, models.Field):
+        fallback_str = '%s.%s' % (qn(model._meta.db_table),
+                                  qn(fallback.column))
+        locales = ('lang',)
+    else:
+        fallback_str = '%s'
+        locales = ('lang', 'fallback')
+
+    # Add the selects and joins for each translated field on the model.
+    for field in fields:
         name = field.column
         d = {'t1': 't1_' + name, 't2': 't2_' + name,
              'model': qn(model._meta.db_table), 'name': name}
@@ -45,31 +76,156 @@ def build_query(model, connection):
 
     # ids will be added later on.
     sql = """SELECT {model}.{pk}, {selects} FROM {model} {joins}
-             WHERE {model}.{pk} IN {{ids}}"""
+             WHERE {model}.{pk} IN ("""
     s = sql.format(selects=','.join(selects), joins='\n'.join(joins),
                    model=qn(model._meta.db_table), pk=model._meta.pk.column)
-    return s, params
-
-
-def get_trans(items):
+    return s, locales
+
+
+class DeferredTranslations(object):
+    """
+    The translated fields a transform skipped for a batch of items.  The
+    first time one of them is read on any item in the batch, all of them are
+    fetched for the whole batch in one more lookup.
+    """
+
+    def __init__(self, items, names):
+        self.items, self.names = items, names
+
+    def load(self):
+        items, self.items = self.items, []
+        if not items:
+            return
+        for item in items:
+            item.__dict__.pop('_deferred_translations', None)
+        model = items[0].__class__
+        attach(model, items, [f for f in model._meta.translated_fields
+                              if f.name in self.names])
+
+
+def only(*names):
+    """A get_trans transform that loads ``names`` and defers the rest."""
+    def transform(items):
+        return get_trans(items, names)
+    transform.only = names
+    return transform
+
+
+def get_trans(items, names=None):
+    """
+    Attach translations in the current language (or the fallback) to
+    ``items``.  Strings come from the cache with one multi-get; only the
+    items with misses go to the database, and what it finds is cached.
+
+    If ``names`` is given only those translated fields are loaded; the rest
+    are deferred until one of them is used.
+    """
     if not items:
         return
 
+    model = items[0].__class__
+    fields = model._meta.translated_fields
+    if names is not None:
+        deferred = [f.name for f in fields if f.name not in names]
+        if deferred:
+            batch = DeferredTranslations(list(items), deferred)
+            for item in items:
+                item._deferred_translations = batch
+        fields = [f for f in fields if f.name in names]
+    attach(model, items, fields)
+
+
+def attach(model, items, fields):
+    """Attach ``fields`` to ``items`` from the cache or the database."""
+    lang = translation.get_language()
+    fallback = get_fallback(model)
+
+    def locales(item):
+        if isinstance(fallback, models.Field):
+            return lang, getattr(item, fallback.attname)
+        return lang, fallback
+
+    keys = set()
+    for item in items:
+        for field in fields:
+            trans_id = getattr(item, field.attname)
+            if trans_id is not None:
+                keys.update(locale_cache_key(trans_id, locale)
+                            for locale in locales(item))
+    cached = cache.get_many(list(keys)) if keys else {}
+
+    misses = []
+    for item in items:
+        found, complete = {}, True
+        for field in fields:
+            trans_id = getattr(item, field.attname)
+            if trans_id is None:
+                continue
+            primary, default = [locale_cache_key(trans_id, locale)
+                                for locale in locales(item)]
+            if cached.get(primary):
+                found[field] = cached[primary]
+            elif primary in cached and default in cached:
+                if cached[default]:
+                    found[field] = cached[default]
+            else:
+                complete = False
+                break
+        if complete:
+            for field, values in found.items():
+                setattr(item, field.name, field.rel.to(*values))
+        else:
+            misses.append(item)
+
+    if misses:
+        get_trans_from_db(model, misses, locales, fields)
+
+
+def get_trans_from_db(model, items, locales, fields):
     connection = connections[multidb.get_slave()]
     cursor = connection.cursor()
 
-    model = items[0].__class__
-    sql, params = build_query(model, connection)
+    sql, layout = build_query(model, connection, fields)
+    current = {'lang': translation.get_language(),
+               'fallback': get_fallback(model)}
+    params = [current[locale] for locale in layout] * len(fields)
     item_dict = dict((item.pk, item) for item in items)
-    ids = ','.join(map(str, item_dict.keys()))
+    ids = item_dict.keys()
+
+    rows = []
+    for i in xrange(0, len(ids), CHUNK_SIZE):
+        chunk = ids[i:i + CHUNK_SIZE]
+        placeholders = ','.join(['%s'] * len(chunk))
+        cursor.execute(sql + placeholders + ')', params + chunk)
+        rows.extend(cursor.fetchall())
 
-    cursor.execute(sql.format(ids='(%s)' % ids), tuple(params))
     step = len(trans_fields)
-    for row in cursor.fetchall():
+    to_cache = {}
+    for row in rows:
         # We put the item's pk as the first selected field.
         item = item_dict[row[0]]
-        for index, field in enumerate(model._meta.translated_fields):
+        lang, default = locales(item)
+        for index, field in enumerate(fields):
             start = 1 + step * index
-            t = Translation(*row[start:start+step])
+            values = row[start:start+step]
+            # Build the field's own class (e.g. PurifiedTranslation) so the
+            # descriptor doesn't have to switch it.
+            t = field.rel.to(*values)
             if t.id is not None and t.localized_string is not None:
                 setattr(item, field.name, t)
+
+            # Remember what each locale had for next time.
+            trans_id = getattr(item, field.attname)
+            if trans_id is None:
+                continue
+            primary = locale_cache_key(trans_id, lang)
+            if t.id is None or t.localized_string is None:
+                to_cache[primary] = MISSING
+                to_cache[locale_cache_key(trans_id, default)] = MISSING
+            elif locale_cache_key(t.id, t.locale) == primary:
+                to_cache[primary] = values
+            else:
+                to_cache[primary] = MISSING
+                to_cache[locale_cache_key(t.id, t.locale)] = values
+    if to_cache:
+        cache.set_many(to_cache, settings.TRANSLATION_CACHE_TIMEOUT)
@@ -1,3 +1,5 @@
+import json
+
 from django import test
 
 import test_utils
@@ -7,6 +9,7 @@ from nose.tools import eq_
 from amo.urlresolvers import reverse
 from addons.models import Addon
 from files.models import Approval
+from search import timing
 from versions.models import Version
 
 
@@ -66,3 +69,24 @@ def test_settings():
     # Are you there, settings page?
     response = test.Client().get(reverse('zadmin.settings'), follow=True)
     eq_(response.status_code, 200)
+
+
+class TestSearchTiming(test_utils.TestCase):
+    fixtures = ['zadmin/tests/flagged']
+
+    def setUp(self):
+        self.client.login(username='jbalogh@mozilla.com', password='password')
+        timing.reset()
+        timing.record('hydrate', 12, 'addons:weight:app')
+
+    def test_page(self):
+        response = self.client.get(reverse('zadmin.search_timing'))
+        eq_(response.status_code, 200)
+        eq_(response.context['histograms'][0]['shape'], 'addons:weight:app')
+
+    def test_json(self):
+        response = self.client.get(reverse('zadmin.search_timing_json'))
+        eq_(response['Content-Type'], 'application/json')
+        data = json.loads(response.content)
+        eq_(data[0]['stage'], 'hydrate')
+        eq_(data[0]['count'], 1)
@@ -11,6 +11,9 @@ urlpatterns = patterns('',
     url('^env$', views.env, name='amo.env'),
     url('^flagged', views.flagged, name='zadmin.flagged'),
     url('^settings', views.settings, name='zadmin.settings'),
+    url('^search-timing$', views.search_timing, name='zadmin.search_timing'),
+    url('^search-timing\.json$', views.search_timing_json,
+        name='zadmin.search_timing_json'),
 
     # The Django admin.
     url('^models/', include(admin.site.urls)),
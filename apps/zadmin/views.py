@@ -1,3 +1,5 @@
+import json
+
 from django import http
 from django.contrib import admin
 from django.shortcuts import redirect
@@ -9,6 +11,7 @@ import jingo
 import amo.models
 from addons.models import Addon
 from files.models import Approval
+from search import timing
 from versions.models import Version
 
 
@@ -63,3 +66,16 @@ def settings(request):
 @admin.site.admin_view
 def env(request):
     return http.HttpResponse(u'<pre>%s</pre>' % (jinja2.escape(request)))
+
+
+@admin.site.admin_view
+def search_timing(request):
+    return jingo.render(request, 'zadmin/search_timing.html',
+                        {'histograms': timing.snapshot(),
+                         'buckets': timing.BUCKETS})
+
+
+@admin.site.admin_view
+def search_timing_json(request):
+    return http.HttpResponse(json.dumps(timing.snapshot()),
+                             mimetype='application/json')
@@ -0,0 +1,4 @@
+-- The sphinx delta index looks for add-ons and versions changed since the
+-- main index was built.
+CREATE INDEX modified_idx ON addons (modified);
+CREATE INDEX modified_idx ON versions (modified);
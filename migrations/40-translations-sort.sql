@@ -0,0 +1,16 @@
+-- A short, collated copy of every translation for order_by_translation to
+-- sort on instead of the TEXT column.  Kept in sync by Translation saves.
+-- The locale fallback is picked with IFNULL() in the query, so the sort is
+-- still a filesort and only the (id, locale) key is used.
+CREATE TABLE `translations_sort` (
+    `autoid` int(11) unsigned NOT NULL PRIMARY KEY,
+    `id` int(11) unsigned NOT NULL,
+    `locale` varchar(10) NOT NULL,
+    `sort_key` varchar(255) NOT NULL default '',
+    UNIQUE KEY `id_locale` (`id`, `locale`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_general_ci;
+
+INSERT INTO `translations_sort` (`autoid`, `id`, `locale`, `sort_key`)
+    SELECT `autoid`, `id`, `locale`, LEFT(TRIM(`localized_string`), 255)
+    FROM `translations`
+    WHERE `localized_string` IS NOT NULL;
@@ -0,0 +1,34 @@
+-- appsupport becomes the listing table behind AddonManager.listed: one row
+-- per (addon, app, file status).  Kept in sync by addons.models signals.
+-- The rows are rebuilt below, and clearing them first keeps the old ones
+-- from clashing on the new unique key.
+DELETE FROM `appsupport`;
+
+ALTER TABLE `appsupport`
+    ADD COLUMN `status` int(11) unsigned NOT NULL default 0,
+    ADD COLUMN `addontype_id` int(11) unsigned NOT NULL default 0,
+    ADD COLUMN `min` bigint(20) NULL,
+    ADD COLUMN `max` bigint(20) NULL,
+    ADD KEY `app_status_addon` (`app_id`, `status`, `addon_id`),
+    ADD UNIQUE KEY `addon_app_status` (`addon_id`, `app_id`, `status`);
+
+INSERT INTO `appsupport` (`addon_id`, `app_id`, `status`, `addontype_id`,
+                          `min`, `max`, `created`, `modified`)
+    SELECT addons.id, av.application_id, files.status, addons.addontype_id,
+           MIN(min_av.version_int), MAX(max_av.version_int), NOW(), NOW()
+    FROM addons
+    INNER JOIN versions ON (versions.addon_id = addons.id)
+    INNER JOIN applications_versions AS av ON (av.version_id = versions.id)
+    INNER JOIN files ON (files.version_id = versions.id)
+    LEFT JOIN appversions AS min_av ON (min_av.id = av.min)
+    LEFT JOIN appversions AS max_av ON (max_av.id = av.max)
+    WHERE NOT (addons.addontype_id = 9 OR addons.status = 6)
+    GROUP BY addons.id, av.application_id, files.status;
+
+-- Personas (type 9) and self-hosted add-ons (status 6) go with every app.
+INSERT INTO `appsupport` (`addon_id`, `app_id`, `status`, `addontype_id`,
+                          `created`, `modified`)
+    SELECT addons.id, applications.id, addons.status, addons.addontype_id,
+           NOW(), NOW()
+    FROM addons, applications
+    WHERE addons.addontype_id = 9 OR addons.status = 6;
@@ -0,0 +1,23 @@
+-- The sphinx delta only sees rows that still exist, so log the add-ons that
+-- lose rows here.  Its kill-list hides every document those add-ons had in
+-- the main index.  name_id is only set when the add-on itself is deleted.
+CREATE TABLE `search_deletions` (
+    `id` int(11) unsigned NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    `addon_id` int(11) unsigned NOT NULL,
+    `name_id` int(11) unsigned NULL,
+    `created` datetime NOT NULL,
+    KEY `created` (`created`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+CREATE TRIGGER `search_deletions_addons` AFTER DELETE ON `addons`
+    FOR EACH ROW INSERT INTO `search_deletions` (`addon_id`, `name_id`,
+                                                 `created`)
+    VALUES (OLD.id, OLD.name, NOW());
+
+CREATE TRIGGER `search_deletions_versions` AFTER DELETE ON `versions`
+    FOR EACH ROW INSERT INTO `search_deletions` (`addon_id`, `created`)
+    VALUES (OLD.addon_id, NOW());
+
+CREATE TRIGGER `search_deletions_apps` AFTER DELETE ON `applications_versions`
+    FOR EACH ROW INSERT INTO `search_deletions` (`addon_id`, `created`)
+    SELECT addon_id, NOW() FROM versions WHERE id = OLD.version_id;
@@ -344,6 +344,21 @@ CACHE_PREFIX = 'amo:'
 # Number of seconds a count() query should be cached.  Keep it short because
 # it's not possible to invalidate these queries.
 CACHE_COUNT_TIMEOUT = 60
+# Number of seconds amo.models.cached_count keeps serving an expired count
+# while one request recounts.
+CACHE_COUNT_STALE_TIMEOUT = 60 * 60
+# Seconds a request waits for another one to count a listing that isn't
+# cached at all before it guesses.
+CACHE_COUNT_WAIT = 2
+
+# Listings paged with amo.utils.paginate(seek=...) link this many pages by
+# number; later pages are reached with keyset page tokens.
+NUMBERED_PAGES = 10
+
+# Number of seconds to cache each (translation id, locale) string that
+# translations.transformer.get_trans looks up.  Saving a translation
+# invalidates its entry.
+TRANSLATION_CACHE_TIMEOUT = 60 * 60 * 24
 
 # External tools.
 SPHINX_INDEXER = 'indexer'
@@ -353,6 +368,22 @@ SPHINX_CATALOG_PATH = '/tmp/data/sphinx'
 SPHINX_DATA_PATH = '/tmp/log/searchd'
 SPHINX_HOST = '127.0.0.1'
 SPHINX_PORT = 3312
+# Persistent connections to searchd kept open by each process, and how many
+# seconds one may sit idle before we close it.  Keep the idle timeout below
+# searchd's client_timeout.
+SPHINX_POOL_SIZE = 5
+SPHINX_POOL_IDLE_TIMEOUT = 60
+# Seconds to cache search results.  They're invalidated when the indexes are
+# rotated, so this can be long.
+SEARCH_CACHE_TIMEOUT = 60 * 60
+# Seconds to keep the in-process category/tag tables used by search.
+SEARCH_LOOKUP_TIMEOUT = 60 * 5
+# Seconds to keep the in-process index of featured add-on ids.
+FEATURED_INDEX_TIMEOUT = 60 * 5
+# Seconds to cache the id pools amo.models.random_sample picks from, and the
+# most ids a pool holds so it fits in one memcached item.
+RANDOM_POOL_TIMEOUT = 60 * 10
+RANDOM_POOL_SIZE = 1000
 
 JAVA_BIN = '/usr/bin/java'
 